@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Task, Payment, UserProfile
+from .search import search_tasks
 
 
 # TASK ADMIN
@@ -19,6 +20,12 @@ class TaskAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description')
     ordering = ('-updated_at',)
 
+    # Full-text index instead of an icontains scan (see core/search.py)
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_tasks(queryset, search_term), False
+
 
 
 # PAYMENT ADMIN
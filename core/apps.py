@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from .authentication import user_changed
+        from .metrics import install_query_timer
+        from .models import UserProfile
+        from .search import restore_sqlite_triggers
+
+        # Count and time every query for InstrumentationMiddleware
+        connection_created.connect(install_query_timer)
+
+        # SQLite table rebuilds drop the full-text search triggers
+        post_migrate.connect(restore_sqlite_triggers, sender=self)
+
+        # Drop the cached auth user whenever the user or profile changes
+        for model in (User, UserProfile):
+            post_save.connect(user_changed, sender=model)
+            post_delete.connect(user_changed, sender=model)
@@ -0,0 +1,156 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import ArchivedNotification, ArchivedTask, Notification, Task, TaskComment
+from .serializers import TaskCommentSerializer, TaskCompletionSerializer
+from .services import adjust_unread_count, bump_notification_version, bump_task_version
+
+
+# COLD DATA ARCHIVAL
+# `manage.py archive_cold_data` moves rows that are no longer part of any
+# hot path out of core_task / core_notification:
+#
+# - paid tasks untouched for ARCHIVE_AFTER_DAYS, with their completion,
+#   comments and payments as JSON snapshots (completion and comments as the
+#   API renders them, so task detail can serve them unchanged) and every
+#   notification about them, since Notification.task cascades on delete;
+# - read notifications older than ARCHIVE_AFTER_DAYS.
+#
+# Each batch is copied and deleted in one transaction, with the rows taken
+# FOR UPDATE SKIP LOCKED, so the job can run next to live traffic and be
+# interrupted at any point. The `type=history` task feed and the
+# dashboards read both tables (see views.task_history_response and
+# services.business_dashboard_stats).
+
+
+def archive_cutoff(days=None):
+    return timezone.now() - timedelta(days=days or settings.ARCHIVE_AFTER_DAYS)
+
+
+def archived_notification(notification):
+    return ArchivedNotification(
+        id=notification.id,
+        recipient_id=notification.recipient_id,
+        actor_id=notification.actor_id,
+        task_id=notification.task_id,
+        task_title=notification.task.title if notification.task_id else '',
+        type=notification.type,
+        message=notification.message,
+        is_read=notification.is_read,
+        created_at=notification.created_at,
+    )
+
+
+def move_notifications(notifications):
+    ArchivedNotification.objects.bulk_create(
+        [archived_notification(notification) for notification in notifications],
+        ignore_conflicts=True,  # a retried batch may have copied some already
+    )
+    Notification.objects.filter(pk__in=[n.pk for n in notifications]).delete()
+
+    # Unread ones leave the inbox, so they leave the cached counter too
+    unread = Counter(n.recipient_id for n in notifications if not n.is_read)
+    for recipient_id, count in unread.items():
+        adjust_unread_count(recipient_id, -count)
+    for recipient_id in {n.recipient_id for n in notifications}:
+        bump_notification_version(recipient_id)
+
+
+def archived_task(task):
+    completion = getattr(task, 'completion', None)
+
+    return ArchivedTask(
+        id=task.id,
+        title=task.title,
+        description=task.description,
+        price=task.price,
+        created_by_id=task.created_by_id,
+        claimed_by_id=task.claimed_by_id,
+        status=task.status,
+        duration_minutes=task.duration_minutes,
+        created_at=task.created_at,
+        updated_at=task.updated_at,
+        completion=TaskCompletionSerializer(completion).data if completion else None,
+        comments=TaskCommentSerializer(task.comments.all(), many=True).data,
+        payments=[
+            {
+                "id": payment.id,
+                "stripe_payment_intent_id": payment.stripe_payment_intent_id,
+                "amount": payment.amount,
+                "status": payment.status,
+                "created_at": payment.created_at,
+            }
+            for payment in task.payments.all()
+        ],
+    )
+
+
+def archive_tasks(cutoff, batch_size=None):
+    """
+    Archive paid tasks last updated before `cutoff`. Returns the count.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    archived = 0
+
+    while True:
+        with transaction.atomic():
+            tasks = list(
+                Task.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .filter(status='paid', updated_at__lt=cutoff)
+                .select_related('completion__completed_by')
+                .prefetch_related(
+                    Prefetch(
+                        'comments',
+                        queryset=TaskComment.objects.select_related('user').order_by('created_at', 'id'),
+                    ),
+                    'payments',
+                )
+                .order_by('id')[:batch_size]
+            )
+            if not tasks:
+                return archived
+
+            ArchivedTask.objects.bulk_create(
+                [archived_task(task) for task in tasks],
+                ignore_conflicts=True,
+            )
+            move_notifications(list(
+                Notification.objects.filter(task__in=tasks).select_related('task')
+            ))
+            # Cascades to the completions, comments and payments
+            Task.objects.filter(pk__in=[task.pk for task in tasks]).delete()
+
+            for task in tasks:
+                bump_task_version(task.id)
+
+        archived += len(tasks)
+
+
+def archive_notifications(cutoff, batch_size=None):
+    """
+    Archive read notifications created before `cutoff`. Returns the count.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    archived = 0
+
+    while True:
+        with transaction.atomic():
+            notifications = list(
+                Notification.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .filter(is_read=True, created_at__lt=cutoff)
+                .select_related('task')
+                .order_by('id')[:batch_size]
+            )
+            if not notifications:
+                return archived
+
+            move_notifications(notifications)
+
+        archived += len(notifications)
@@ -0,0 +1,234 @@
+from django.shortcuts import aget_object_or_404
+from asgiref.sync import sync_to_async
+
+from adrf.decorators import api_view
+from adrf.views import APIView as AsyncAPIView
+from rest_framework import status
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser, FormParser
+
+from .models import *
+from .serializers import *
+from .services import *
+from .pagination import TaskFeedPagination
+from .storage import StorageError
+from .views import (
+    add_validators,
+    list_etag,
+    not_modified_response,
+    payment_in_progress_response,
+    save_new_task,
+    store_task_completion,
+    task_feed_queryset,
+    task_history_response,
+)
+
+
+# ASYNC VIEWS
+# Served natively by the ASGI entry point (microtasks/asgi.py). While a
+# view awaits Stripe, Supabase, Redis or the DB the event loop keeps
+# serving other requests, instead of one slow call pinning a whole sync
+# worker. Routed in place of their sync twins in views.py when
+# ASYNC_API_VIEWS is on (see urls.py); the query logic is shared.
+#
+# The ORM is only used through its async API here (aget, afirst, ...):
+# lazy relations like request.user.userprofile would raise
+# SynchronousOnlyOperation inside the event loop. Code that needs a
+# transaction runs in a worker thread through sync_to_async.
+
+
+async def get_profile(user):
+    # CachedJWTAuthentication attaches the profile (id and role only) to
+    # the user, so this is normally an attribute read; the query is the
+    # fallback.
+    if User.userprofile.is_cached(user):
+        return user.userprofile
+    return await UserProfile.objects.aget(user=user)
+
+
+async def get_role(user):
+    return (await get_profile(user)).role
+
+
+# TASK LIST + CREATE
+class AsyncTaskListCreateView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        if request.query_params.get('type') == 'history':
+            return await sync_to_async(task_history_response)(request)
+
+        etag = list_etag(request, await atask_feed_version())
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        queryset = TaskSerializer.setup_eager_loading(
+            task_feed_queryset(request.user, request.query_params)
+        )
+        paginator = TaskFeedPagination()
+        page = await paginator.apaginate_queryset(queryset, request)
+        if page is not None:
+            response = paginator.get_paginated_response(
+                TaskSerializer(page, many=True).data
+            )
+        else:
+            tasks = [task async for task in queryset]
+            response = Response(TaskSerializer(tasks, many=True).data)
+
+        return add_validators(response, etag)
+
+    async def post(self, request):
+        if await get_role(request.user) != 'business':
+            raise PermissionDenied("Only business users can create tasks.")
+
+        serializer = TaskSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        await sync_to_async(save_new_task)(serializer, request.user)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# COMPLETE TASK (UPLOAD PROOF)
+class AsyncCompleteTaskView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    async def patch(self, request, pk):
+        task = await aget_object_or_404(
+            Task,
+            pk=pk,
+            claimed_by=request.user,
+            status='claimed'
+        )
+
+        if await get_role(request.user) != 'worker':
+            raise PermissionDenied("Only workers can complete tasks.")
+
+        # Prevent double submission
+        if await TaskCompletion.objects.filter(task=task).aexists():
+            return Response(
+                {"error": "Task already completed"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Validate input
+        proof_image = request.data.get('proof_image')
+        completion_details = request.data.get('completion_details')
+
+        if not proof_image or not completion_details:
+            return Response(
+                {"error": "Proof image and completion details are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Image processing is CPU bound: keep it off the event loop
+        try:
+            image, thumbnail = await sync_to_async(
+                prepare_proof_images, thread_sensitive=False
+            )(proof_image)
+        except InvalidImage:
+            return Response(
+                {"error": "Proof image is not a valid image"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            task = await sync_to_async(store_task_completion)(
+                pk, request.user, completion_details, image, thumbnail
+            )
+        except StorageError:
+            return Response(
+                {"error": "Proof image could not be stored, please try again"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        return Response(
+            {
+                "message": "✅ Task marked as completed",
+                "task_id": task.id
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+# PAY TASK (STRIPE)
+class AsyncPayTaskView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def patch(self, request, pk):
+        # Fetch the task: only creator can pay for approved tasks
+        task = await aget_object_or_404(
+            Task,
+            pk=pk,
+            created_by=request.user,
+            status='approved'
+        )
+
+        # Role check: only business can trigger payment
+        if await get_role(request.user) != 'business':
+            raise PermissionDenied("Only business users can pay for tasks.")
+
+        # Billing details: the cached auth profile only carries the role
+        business_profile = await UserProfile.objects.aget(user=request.user)
+
+        # Reuses the task's open PaymentIntent, else creates one (idempotent)
+        try:
+            intent = await aget_or_create_payment_intent([task], request.user)
+        except PaymentInProgress:
+            return payment_in_progress_response()
+
+        return Response(
+            payment_intent_response(intent, request.user, business_profile)
+        )
+
+
+# Notifications
+class AsyncNotificationListView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        etag = list_etag(request, await anotification_version(request.user.id))
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        queryset = NotificationSerializer.setup_eager_loading(
+            Notification.objects.filter(
+                recipient=request.user
+            ).order_by("-created_at")
+        )
+        notifications = [notification async for notification in queryset]
+        response = Response(NotificationSerializer(notifications, many=True).data)
+
+        return add_validators(response, etag)
+
+
+class AsyncUnreadNotificationCountView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        count = await aunread_notification_count(request.user.id)
+
+        return Response({"unread_count": count})
+
+
+# DASHBOARD STATS
+# The counters live in Redis hashes behind django_redis' sync client,
+# so the lookup runs in a worker thread.
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+async def async_business_dashboard_view(request):
+    data = await sync_to_async(business_dashboard_stats)(request.user.id)
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+async def async_worker_dashboard_view(request):
+    data = await sync_to_async(worker_dashboard_stats)(request.user.id)
+    return Response(data)
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .metrics import record_cache
+from .models import UserProfile
+
+
+# JWT FAST PATH
+# simplejwt's JWTAuthentication loads the User on every request, and most
+# views then load request.user.userprofile for their role check: two
+# queries per call. CachedJWTAuthentication resolves both with a single
+# query and keeps the result in Redis under "auth:user:<id>" for
+# AUTH_USER_CACHE_TTL.
+#
+# Only the fields authentication and the role checks need are cached (no
+# password hash, just the md5 fingerprint simplejwt's revoke check
+# compares, and only when CHECK_REVOKE_TOKEN is on). The User and its
+# UserProfile are rebuilt from them with the remaining fields deferred;
+# views that need the whole profile load it themselves.
+#
+# Saving or deleting a User or UserProfile (ProfileUpdateView, password
+# changes, deactivation in the admin) drops the entry after commit; the
+# signal handlers are connected in apps.py.
+
+AUTH_USER_FIELDS = ('id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser')
+AUTH_PROFILE_FIELDS = ('id', 'role')
+
+
+def auth_user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def auth_user_entry(user_id):
+    profile_fields = {f'userprofile__{field}': field for field in AUTH_PROFILE_FIELDS}
+    row = (
+        User.objects.filter(pk=user_id)
+        .values(*AUTH_USER_FIELDS, 'password', *profile_fields)
+        .first()
+    )
+    if row is None:
+        return None
+
+    password = row.pop('password')
+    profile = {field: row.pop(lookup) for lookup, field in profile_fields.items()}
+    return {
+        "user": row,
+        "profile": profile if profile['id'] is not None else None,
+        "revoke_hash": get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None,
+    }
+
+
+def instance_from_fields(model, values):
+    # from_db() wants the values in field order; anything missing is deferred
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db('default', names, [values[name] for name in names])
+
+
+def auth_user_from_entry(entry):
+    user = instance_from_fields(User, entry["user"])
+    user.revoke_hash = entry["revoke_hash"]
+
+    if entry["profile"] is not None:
+        profile = instance_from_fields(UserProfile, {**entry["profile"], "user_id": user.pk})
+        user.userprofile = profile  # caches the relation both ways
+
+    return user
+
+
+def load_auth_user(user_id):
+    """
+    The User (with its UserProfile attached) for `user_id`, or None. Only
+    the AUTH_*_FIELDS are loaded; the rest are deferred.
+    """
+    key = auth_user_key(user_id)
+    entry = cache.get(key)
+    record_cache("auth_user", entry is not None)
+
+    if entry is None:
+        entry = auth_user_entry(user_id)
+        if entry is None:
+            return None
+        cache.set(key, entry, settings.AUTH_USER_CACHE_TTL)
+
+    return auth_user_from_entry(entry)
+
+
+def invalidate_auth_user(user_id):
+    transaction.on_commit(lambda: cache.delete(auth_user_key(user_id)))
+
+
+def user_changed(sender, instance, **kwargs):
+    # post_save / post_delete of User and UserProfile
+    invalidate_auth_user(instance.user_id if sender is UserProfile else instance.pk)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication.get_user() with the user (and role) from the cache.
+    Same checks and errors as simplejwt.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = load_auth_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user.revoke_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Adds a "role" claim, so clients know the user's role without a profile
+    call. Only a hint: the role can change during the token's lifetime, so
+    the server keeps checking the (cached) profile.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        profile = UserProfile.objects.filter(user=user).only('role').first()
+        token['role'] = profile.role if profile else None
+        return token
@@ -0,0 +1,502 @@
+import io
+import itertools
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+import stripe
+
+from .models import (
+    Notification, Task, TaskComment, TaskCompletion, User, UserProfile,
+)
+
+
+# BENCHMARK SUITE
+# Used by `manage.py benchmark`. Seeds a synthetic marketplace into a
+# throwaway test database, replaces Stripe and Supabase with local HTTP
+# stubs, then drives the API in-process through django.test.Client from
+# a pool of threads and reports throughput and latency percentiles.
+# Every attempted request is accounted for: one that raised, answered
+# with an unexpected status or was still running at the scenario timeout
+# counts as an error.
+
+
+# LOCAL STUBS
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    intent_ids = itertools.count(1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = io.BytesIO()
+            while True:
+                size = int(self.rfile.readline().strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body.write(self.rfile.read(size))
+                self.rfile.readline()
+            return body.getvalue()
+
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def reply(self, status, payload=None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def intent(self, intent_id):
+        return {
+            "id": intent_id,
+            "object": "payment_intent",
+            "client_secret": f"{intent_id}_secret_bench",
+            "status": "requires_payment_method",
+        }
+
+    # Stripe: create / retrieve PaymentIntent
+    # Supabase: upload object
+    def do_POST(self):
+        self.read_body()
+        if self.path.startswith("/v1/payment_intents"):
+            return self.reply(200, self.intent(f"pi_bench_{next(self.intent_ids)}"))
+        if self.path.startswith("/storage/v1/object/"):
+            return self.reply(200, {"Key": self.path})
+        self.reply(404)
+
+    def do_GET(self):
+        match = re.match(r"^/v1/payment_intents/([^/?]+)", self.path)
+        if match:
+            return self.reply(200, self.intent(match.group(1)))
+        self.reply(404)
+
+    # Supabase exists(): nothing is stored, so every name is available
+    def do_HEAD(self):
+        self.reply(404)
+
+    def do_DELETE(self):
+        self.reply(200)
+
+
+class PerLoopHTTPXClient(stripe.HTTPXClient):
+    """
+    django.test.Client runs every async view in an event loop of its own,
+    and one httpx.AsyncClient shared between loops hangs. Under ASGI there
+    is one loop per worker, so only the in-process runner needs this: it
+    opens a client per request instead.
+    """
+
+    async def request_async(self, method, url, headers, post_data=None):
+        args, kwargs = self._get_request_args_kwargs(method, url, headers, post_data)
+        async with self.httpx.AsyncClient() as client:
+            try:
+                response = await client.request(*args, **kwargs)
+            except Exception as e:
+                self._handle_request_error(e)
+        return response.content, response.status_code, response.headers
+
+
+class LocalStubs:
+    """
+    Starts the stub server and points Stripe and the default storage at it.
+    """
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        url = f"http://127.0.0.1:{self.server.server_port}"
+        self.saved = (stripe.api_base, stripe.default_http_client, default_storage._base_url)
+        stripe.api_base = url
+        stripe.default_http_client = stripe.RequestsClient(
+            timeout=10, async_fallback_client=PerLoopHTTPXClient(timeout=10),
+        )
+        default_storage._base_url = url
+        return self
+
+    def __exit__(self, *exc):
+        stripe.api_base, stripe.default_http_client, default_storage._base_url = self.saved
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# SEEDING
+
+def seed_marketplace(businesses, workers, tasks_per_status, comments_per_task,
+                     notifications_per_user, seed=0):
+    rng = random.Random(seed)
+    password = make_password("bench-password")
+
+    def create_users(role, count):
+        users = User.objects.bulk_create([
+            User(username=f"bench_{role}_{i}", email=f"{role}{i}@bench.local", password=password)
+            for i in range(count)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role=role, phone="0000000000") for user in users
+        ])
+        return users
+
+    business_users = create_users("business", businesses)
+    worker_users = create_users("worker", workers)
+
+    tasks = []
+    for status, count in tasks_per_status.items():
+        for i in range(count):
+            tasks.append(Task(
+                title=f"Bench {status} task {i}",
+                description=f"Synthetic {status} task used for benchmarking. " * 3,
+                price=rng.randint(50, 5000),
+                duration_minutes=rng.choice([5, 15, 30, 60, 120]),
+                status=status,
+                created_by=rng.choice(business_users),
+                claimed_by=None if status == "open" else rng.choice(worker_users),
+            ))
+    tasks = Task.objects.bulk_create(tasks, batch_size=1000)
+    worked = [task for task in tasks if task.claimed_by_id]
+
+    TaskCompletion.objects.bulk_create([
+        TaskCompletion(
+            task=task,
+            completed_by_id=task.claimed_by_id,
+            proof_image="proofs/bench.webp",
+            proof_thumbnail="proofs/thumbs/bench_thumb.webp",
+            completion_details="Done",
+        )
+        for task in worked if task.status in ("completed", "approved", "paid")
+    ], batch_size=1000)
+
+    TaskComment.objects.bulk_create([
+        TaskComment(
+            task=task,
+            user_id=task.created_by_id if i % 2 else task.claimed_by_id,
+            message=f"Message {i}",
+        )
+        for task in worked for i in range(comments_per_task)
+    ], batch_size=1000)
+
+    Notification.objects.bulk_create([
+        Notification(
+            recipient=user,
+            task=rng.choice(worked) if worked else None,
+            type="task_claimed",
+            message="Bench notification",
+            is_read=rng.random() < 0.7,
+        )
+        for user in business_users + worker_users for _ in range(notifications_per_user)
+    ], batch_size=1000)
+
+    return {
+        "businesses": business_users,
+        "workers": worker_users,
+        "tasks": tasks,
+    }
+
+
+# RUNNER
+
+def auth_header(user):
+    return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# Answers a scenario may give without counting as an error
+OK_STATUSES = frozenset({200, 201, 304})
+
+# Per scenario: a stuck request (or stub) must not hang the whole run
+SCENARIO_TIMEOUT = 120
+
+
+def summarize(attempted, latencies, statuses, wall_time, expected=OK_STATUSES):
+    """
+    `statuses` has one entry per finished request: its status code, or
+    "exception" if it raised. Requests that never finished (timeout) are
+    the difference to `attempted`; they count as errors, as do
+    exceptions and any status outside `expected`.
+    """
+    lost = attempted - len(statuses)
+    errors = lost + sum(1 for code in statuses if code not in expected)
+    codes = [str(code) for code in statuses]
+    return {
+        "attempted": attempted,
+        "completed": len(statuses),
+        "lost": lost,
+        "errors": errors,
+        "status_codes": {code: codes.count(code) for code in sorted(set(codes))},
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def timed_request(send):
+    """
+    (elapsed seconds, status code or "exception") of send().
+    """
+    started = time.perf_counter()
+    try:
+        code = send().status_code
+    except Exception:
+        code = "exception"
+    return time.perf_counter() - started, code
+
+
+def join_all(threads, timeout):
+    # Daemon threads: one still stuck past the deadline is abandoned
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def run_concurrently(make_request, total, concurrency, timeout=SCENARIO_TIMEOUT):
+    """
+    make_request(client, i) -> response, called `total` times spread over
+    `concurrency` threads, each with its own Client.
+    """
+    counter = itertools.count()
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker():
+        # Server errors come back as 500 responses instead of raising here
+        client = Client(raise_request_exception=False)
+        try:
+            while not stop.is_set():
+                i = next(counter)
+                if i >= total:
+                    return
+                elapsed, code = timed_request(lambda: make_request(client, i))
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.append(code)
+        finally:
+            connections.close_all()  # else the test database can't be dropped
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    join_all(threads, timeout)
+    stop.set()
+
+    with lock:
+        return summarize(total, list(latencies), list(statuses), time.perf_counter() - started)
+
+
+def claim_race(open_tasks, workers, racers, rounds, timeout=SCENARIO_TIMEOUT):
+    """
+    `racers` workers hit the claim endpoint of the same open task at once,
+    `rounds` times. Exactly one claim per task may succeed.
+    """
+    if not connection.features.has_select_for_update:
+        # SQLite serializes writers: the racers fail with "database table
+        # is locked" instead of racing
+        return {"skipped": f"needs concurrent writers, not {connection.vendor}"}
+
+    latencies, statuses, violations = [], [], 0
+    wall_time = 0.0
+    rounds = min(rounds, len(open_tasks))
+    deadline = time.monotonic() + timeout
+
+    for task in open_tasks[:rounds]:
+        barrier = threading.Barrier(racers)
+        results = []
+        lock = threading.Lock()
+
+        def racer(user):
+            client = Client(raise_request_exception=False)
+            headers = auth_header(user)
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass  # start anyway, unsynchronized
+            result = timed_request(lambda: client.patch(f"/api/tasks/{task.id}/claim/", **headers))
+            connections.close_all()
+            with lock:
+                results.append(result)
+
+        threads = [
+            threading.Thread(target=racer, args=(workers[i % len(workers)],), daemon=True)
+            for i in range(racers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        join_all(threads, max(0.0, deadline - time.monotonic()))
+        wall_time += time.perf_counter() - started
+
+        with lock:
+            results = list(results)
+        winners = sum(1 for _, code in results if code == 200)
+        if winners != 1:
+            violations += 1
+        latencies += [elapsed for elapsed, _ in results]
+        statuses += [code for _, code in results]
+
+    # Losers find the task taken (404) or locked (409)
+    summary = summarize(racers * rounds, latencies, statuses, wall_time, OK_STATUSES | {404, 409})
+    summary["rounds"] = rounds
+    summary["single_winner_violations"] = violations
+    return summary
+
+
+def proof_png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 900), (120, 160, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run_benchmarks(data, requests, concurrency, racers, only=None, timeout=SCENARIO_TIMEOUT):
+    businesses, workers, tasks = data["businesses"], data["workers"], data["tasks"]
+    by_status = {}
+    for task in tasks:
+        by_status.setdefault(task.status, []).append(task)
+
+    business_headers = {user.id: auth_header(user) for user in businesses}
+    business_header_list = list(business_headers.values())
+    worker_headers = {user.id: auth_header(user) for user in workers}
+    worker_header_list = list(worker_headers.values())
+    visible = [task for task in tasks if task.status != "open"]
+    approved = by_status.get("approved", [])
+    claimed = by_status.get("claimed", [])
+    image = proof_png()
+
+    def complete(client, i):
+        task = claimed[i]
+        return client.patch(
+            f"/api/tasks/{task.id}/complete/",
+            data=encode_multipart(BOUNDARY, {
+                "completion_details": "Bench",
+                "proof_image": SimpleUploadedFile("proof.png", image, "image/png"),
+            }),
+            content_type=MULTIPART_CONTENT,
+            **worker_headers[task.claimed_by_id],
+        )
+
+    scenarios = {
+        "task_feed": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/tasks/?status=open&paginate=1", **worker_header_list[i % len(worker_header_list)]
+            ),
+            requests, concurrency, timeout,
+        ),
+        "task_search": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/tasks/search/?q=synthetic+task&max_price=2500",
+                **worker_header_list[i % len(worker_header_list)],
+            ),
+            requests, concurrency, timeout,
+        ),
+        "recommended": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/tasks/recommended/", **worker_header_list[i % len(worker_header_list)]
+            ),
+            requests, concurrency, timeout,
+        ),
+        "task_detail": lambda: run_concurrently(
+            lambda client, i: client.get(
+                f"/api/tasks/{visible[i % len(visible)].id}/",
+                **worker_headers[visible[i % len(visible)].claimed_by_id],
+            ),
+            requests, concurrency, timeout,
+        ),
+        "comments": lambda: run_concurrently(
+            lambda client, i: client.get(
+                f"/api/tasks/{visible[i % len(visible)].id}/comments/",
+                **worker_headers[visible[i % len(visible)].claimed_by_id],
+            ),
+            requests, concurrency, timeout,
+        ),
+        "business_dashboard": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/dashboard/business/", **business_header_list[i % len(business_header_list)]
+            ),
+            requests, concurrency, timeout,
+        ),
+        "worker_dashboard": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/dashboard/worker/", **worker_header_list[i % len(worker_header_list)]
+            ),
+            requests, concurrency, timeout,
+        ),
+        "notifications": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/notifications/", **worker_header_list[i % len(worker_header_list)]
+            ),
+            requests, concurrency, timeout,
+        ),
+        "unread_count": lambda: run_concurrently(
+            lambda client, i: client.get(
+                "/api/notifications/unread-count/", **worker_header_list[i % len(worker_header_list)]
+            ),
+            requests, concurrency, timeout,
+        ),
+        "pay": lambda: run_concurrently(
+            lambda client, i: client.patch(
+                f"/api/tasks/{approved[i % len(approved)].id}/pay/",
+                **business_headers[approved[i % len(approved)].created_by_id],
+            ),
+            min(requests, len(approved) * 2), concurrency, timeout,
+        ),
+        "complete": lambda: run_concurrently(
+            complete, min(requests, len(claimed)), concurrency, timeout,
+        ),
+        # Runs last: it claims open tasks the feed scenario reads
+        "claim_race": lambda: claim_race(
+            by_status.get("open", []), workers, racers, rounds=max(1, requests // racers), timeout=timeout,
+        ),
+    }
+
+    results = {}
+    for name, scenario in scenarios.items():
+        if only and name not in only:
+            continue
+        results[name] = scenario()
+    return results
+
+
+def compare_results(current, baseline, max_regression):
+    """
+    Scenario/metric pairs whose p95 latency regressed by more than
+    `max_regression` percent against `baseline`.
+    """
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before or not before.get("p95_ms") or "p95_ms" not in result:
+            continue
+        change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        if change > max_regression:
+            regressions.append((name, before["p95_ms"], result["p95_ms"], round(change, 1)))
+    return regressions
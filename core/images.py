@@ -0,0 +1,64 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# PROOF IMAGE PROCESSING
+# Phone photos arrive as multi-megabyte JPEGs with EXIF (GPS, device info).
+# Before storing, each proof is re-encoded without metadata, downsized to
+# PROOF_IMAGE_MAX_DIMENSION and paired with a small thumbnail for previews.
+
+EXTENSIONS = {
+    'WEBP': '.webp',
+    'JPEG': '.jpg',
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def encode(img, fmt, quality):
+    # Formats without alpha need a plain RGB image
+    if fmt == 'JPEG' and img.mode != 'RGB':
+        img = img.convert('RGB')
+    elif img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+
+    buffer = BytesIO()
+    # No exif= argument, so no metadata is written
+    img.save(buffer, format=fmt, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def process_proof_image(upload):
+    """
+    Returns (image, thumbnail) as named ContentFiles ready for storage.
+    Raises InvalidImage if `upload` isn't a readable image.
+    """
+    fmt = settings.PROOF_IMAGE_FORMAT  # validated in settings
+    quality = settings.PROOF_IMAGE_QUALITY
+    max_dimension = settings.PROOF_IMAGE_MAX_DIMENSION
+    thumbnail_size = settings.PROOF_THUMBNAIL_SIZE
+
+    try:
+        with Image.open(upload) as img:
+            img.load()
+            # Apply the camera orientation before the EXIF tag is dropped
+            img = ImageOps.exif_transpose(img)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e))
+
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    extension = EXTENSIONS[fmt]
+
+    img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    image = ContentFile(encode(img, fmt, quality), name=f"{stem}{extension}")
+
+    img.thumbnail((thumbnail_size, thumbnail_size), Image.Resampling.LANCZOS)
+    thumbnail = ContentFile(encode(img, fmt, quality), name=f"{stem}_thumb{extension}")
+
+    return image, thumbnail
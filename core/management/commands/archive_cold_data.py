@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_cutoff, archive_notifications, archive_tasks
+
+
+class Command(BaseCommand):
+    help = "Move paid tasks and read notifications older than N days into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument("--tasks-only", action="store_true")
+        parser.add_argument("--notifications-only", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options["days"])
+        batch_size = options["batch_size"]
+
+        if not options["notifications_only"]:
+            tasks = archive_tasks(cutoff, batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Archived {tasks} paid tasks"))
+
+        if not options["tasks_only"]:
+            notifications = archive_notifications(cutoff, batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Archived {notifications} read notifications"))
@@ -0,0 +1,144 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmark import SCENARIO_TIMEOUT, LocalStubs, compare_results, run_benchmarks, seed_marketplace
+
+
+SCENARIOS = [
+    "task_feed", "task_search", "recommended", "task_detail", "comments", "business_dashboard", "worker_dashboard",
+    "notifications", "unread_count", "pay", "complete", "claim_race",
+]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic marketplace into a throwaway test database and measure "
+        "throughput and p50/p95/p99 latency of the hot API endpoints. Stripe and "
+        "Supabase are replaced by local stubs. Redis must be reachable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--businesses", type=int, default=20)
+        parser.add_argument("--workers", type=int, default=100)
+        parser.add_argument("--tasks-per-status", type=int, default=500)
+        parser.add_argument("--comments-per-task", type=int, default=3)
+        parser.add_argument("--notifications-per-user", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=500, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Client threads per scenario.")
+        parser.add_argument("--racers", type=int, default=16, help="Workers racing for each task in claim_race.")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Run only these (repeatable).")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results.")
+        parser.add_argument("--baseline", help="Previous results file to compare against.")
+        parser.add_argument(
+            "--max-regression", type=float, default=20.0,
+            help="Fail if a scenario's p95 is this many percent slower than the baseline.",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=SCENARIO_TIMEOUT,
+            help="Seconds a scenario may run; requests still pending then count as errors.",
+        )
+        parser.add_argument("--keepdb", action="store_true", help="Reuse the test database between runs.")
+
+    def handle(self, *args, **options):
+        statuses = ["open", "claimed", "completed", "approved", "paid"]
+        config = {
+            "businesses": options["businesses"],
+            "workers": options["workers"],
+            "tasks_per_status": {status: options["tasks_per_status"] for status in statuses},
+            "comments_per_task": options["comments_per_task"],
+            "notifications_per_user": options["notifications_per_user"],
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "racers": options["racers"],
+            "seed": options["seed"],
+            "timeout": options["timeout"],
+        }
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+
+        try:
+            self.stdout.write("🌱 Seeding marketplace...")
+            data = seed_marketplace(
+                config["businesses"],
+                config["workers"],
+                config["tasks_per_status"],
+                config["comments_per_task"],
+                config["notifications_per_user"],
+                seed=config["seed"],
+            )
+
+            with LocalStubs():
+                results = run_benchmarks(
+                    data,
+                    requests=config["requests"],
+                    concurrency=config["concurrency"],
+                    racers=config["racers"],
+                    only=options["scenario"],
+                    timeout=config["timeout"],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        report = {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "async_views": settings.ASYNC_API_VIEWS,
+            },
+            "config": config,
+            "results": results,
+        }
+
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+        for name, result in results.items():
+            if "skipped" in result:
+                self.stdout.write(f"{name:<20} skipped: {result['skipped']}")
+                continue
+            self.stdout.write(
+                f"{name:<20} {result['throughput_rps']:>8} req/s  "
+                f"p50 {result['p50_ms']:>7} ms  p95 {result['p95_ms']:>7} ms  "
+                f"p99 {result['p99_ms']:>7} ms  "
+                f"{result['completed']}/{result['attempted']} done  errors {result['errors']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"✅ Results written to {options['output']}"))
+
+        failures = []
+        if results.get("claim_race", {}).get("single_winner_violations"):
+            failures.append("claim_race: a task was claimed more than once (or by nobody)")
+        failures += [
+            f"{name}: {result['errors']} errors in {result['attempted']} requests ({result['lost']} never finished)"
+            for name, result in results.items() if result.get("errors")
+        ]
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)["results"]
+            for name, before, after, change in compare_results(results, baseline, options["max_regression"]):
+                failures.append(f"{name}: p95 {before} ms → {after} ms (+{change}%)")
+
+        if failures:
+            raise CommandError("Benchmark failed:\n" + "\n".join(failures))
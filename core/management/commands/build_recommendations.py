@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.recommendations import build_all_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild every worker's recommended task list (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Workers per Redis pipeline.")
+
+    def handle(self, *args, **options):
+        built = build_all_recommendations(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Built recommendations for {built} workers"))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Notification, OutboxEvent, Payment, Task
+from core.search import search_tasks
+
+
+# The hot query shapes of the API, with placeholder ids: only the plans matter.
+def hot_queries():
+    user_id = 1
+    return {
+        "task feed (status=open)": Task.objects.filter(status='open').order_by('-updated_at', '-id')[:21],
+        "task feed (type=posted)": Task.objects.filter(created_by_id=user_id, status__in=['open']).order_by('-updated_at')[:21],
+        "task feed (worker)": Task.objects.filter(claimed_by_id=user_id, status__in=['completed', 'approved']).order_by('-updated_at')[:21],
+        "task search": search_tasks(Task.objects.filter(status='open'), 'logo design')[:21],
+        "notification inbox": Notification.objects.filter(recipient_id=user_id).order_by('-created_at'),
+        "unread count": Notification.objects.filter(recipient_id=user_id, is_read=False),
+        "webhook payment lookup": Payment.objects.filter(stripe_payment_intent_id='pi_check'),
+        "outbox pending": OutboxEvent.objects.filter(processed_at__isnull=True).order_by('id')[:100],
+    }
+
+
+def is_sequential_scan(plan):
+    if connection.vendor == 'postgresql':
+        return 'Seq Scan' in plan
+
+    # SQLite: "2 0 0 SCAN core_task" without "USING ... INDEX" reads the
+    # whole table (each line starts with the node ids)
+    return any(
+        'SCAN' in line.split() and 'INDEX' not in line
+        for line in plan.splitlines()
+    )
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot API queries and fail if any of them needs a sequential scan."
+
+    def handle(self, *args, **options):
+        failures = []
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables would make a seq scan the cheapest plan anyway
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, queryset in hot_queries().items():
+                plan = queryset.explain()
+                if is_sequential_scan(plan):
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"✗ {name}\n{plan}\n"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"✓ {name}"))
+
+        if failures:
+            raise CommandError(f"Sequential scans in: {', '.join(failures)}")
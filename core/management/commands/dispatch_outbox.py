@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import dispatch_outbox, purge_processed_outbox
+
+
+class Command(BaseCommand):
+    help = "Drain the transactional outbox (notifications, pushes, recommendations, proof uploads)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain pending events and exit.")
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_purge = 0
+
+        while True:
+            dispatched = dispatch_outbox(batch_size)
+            if dispatched:
+                self.stdout.write(f"Dispatched {dispatched} outbox events")
+                continue
+
+            if options["once"]:
+                return
+
+            # Idle: housekeeping at most once an hour, then wait for new events
+            if time.monotonic() - last_purge > 3600:
+                purged = purge_processed_outbox()
+                if purged:
+                    self.stdout.write(f"Purged {purged} processed outbox events")
+                last_purge = time.monotonic()
+
+            time.sleep(settings.OUTBOX_POLL_INTERVAL)
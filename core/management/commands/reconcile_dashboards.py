@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import reconcile_dashboard_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Redis dashboard counters from the database."
+
+    def handle(self, *args, **options):
+        written = reconcile_dashboard_counters()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {written} dashboards"))
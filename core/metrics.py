@@ -0,0 +1,195 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+
+# REQUEST METRICS
+# InstrumentationMiddleware opens a RequestMetrics for every request and
+# the hooks below add to it: DB queries (execute wrapper installed on each
+# new connection), cache lookups (record_cache) and outbound HTTP calls
+# (instrument_session / timed_external). ContextVars follow the request
+# into sync_to_async threads, so async views are covered too.
+#
+# Totals are kept per process and exposed in the Prometheus text format by
+# metrics_view. With several workers each one reports its own numbers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.external_time = defaultdict(float)
+        self.external_calls = defaultdict(int)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+current_request = ContextVar("current_request_metrics", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)           # (route, method, status)
+        self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.latency_sum = defaultdict(float)      # (route, method)
+        self.latency_count = defaultdict(int)
+        self.db_queries = defaultdict(int)         # route
+        self.db_time = defaultdict(float)
+        self.cache = defaultdict(int)              # (cache, "hit" | "miss")
+        self.external_time = defaultdict(float)    # service
+        self.external_calls = defaultdict(int)
+
+    def observe_request(self, route, method, status, metrics):
+        elapsed = metrics.elapsed
+        key = (route, method)
+
+        with self.lock:
+            self.requests[(route, method, str(status))] += 1
+            buckets = self.latency_buckets[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    buckets[i] += 1
+            self.latency_sum[key] += elapsed
+            self.latency_count[key] += 1
+            self.db_queries[route] += metrics.db_queries
+            self.db_time[route] += metrics.db_time
+
+    def observe_cache(self, name, hit):
+        with self.lock:
+            self.cache[(name, "hit" if hit else "miss")] += 1
+
+    def observe_external(self, service, seconds):
+        with self.lock:
+            self.external_time[service] += seconds
+            self.external_calls[service] += 1
+
+    def render(self):
+        lines = []
+
+        def family(name, type, help):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+
+        with self.lock:
+            family("http_requests_total", "counter", "Requests by route, method and status.")
+            for (route, method, status), value in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {value}')
+
+            family("http_request_duration_seconds", "histogram", "Request latency by route.")
+            for (route, method), buckets in sorted(self.latency_buckets.items()):
+                labels = f'route="{route}",method="{method}"'
+                for bound, value in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {value}')
+                count = self.latency_count[(route, method)]
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {self.latency_sum[(route, method)]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+
+            family("db_queries_total", "counter", "Database queries by route.")
+            for route, value in sorted(self.db_queries.items()):
+                lines.append(f'db_queries_total{{route="{route}"}} {value}')
+
+            family("db_query_seconds_total", "counter", "Database time by route.")
+            for route, value in sorted(self.db_time.items()):
+                lines.append(f'db_query_seconds_total{{route="{route}"}} {value:.6f}')
+
+            family("cache_requests_total", "counter", "Cache lookups by cache and result.")
+            for (name, result), value in sorted(self.cache.items()):
+                lines.append(f'cache_requests_total{{cache="{name}",result="{result}"}} {value}')
+
+            family("external_http_seconds_total", "counter", "Outbound HTTP time by service.")
+            for service, value in sorted(self.external_time.items()):
+                lines.append(f'external_http_seconds_total{{service="{service}"}} {value:.6f}')
+
+            family("external_http_requests_total", "counter", "Outbound HTTP calls by service.")
+            for service, value in sorted(self.external_calls.items()):
+                lines.append(f'external_http_requests_total{{service="{service}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# HOOKS
+
+def query_timer(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # connection_created fires again on every reconnect of the same wrapper
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def record_cache(name, hit):
+    registry.observe_cache(name, hit)
+
+    metrics = current_request.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def record_external(service, seconds):
+    registry.observe_external(service, seconds)
+
+    metrics = current_request.get()
+    if metrics is not None:
+        metrics.external_time[service] += seconds
+        metrics.external_calls[service] += 1
+
+
+@contextmanager
+def timed_external(service):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_external(service, time.perf_counter() - started)
+
+
+def instrument_session(session, service):
+    """
+    Time every call made through a requests.Session (headers received).
+    """
+    def hook(response, *args, **kwargs):
+        record_external(service, response.elapsed.total_seconds())
+
+    session.hooks["response"].append(hook)
+    return session
+
+
+def server_timing(metrics):
+    entries = [
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"',
+        f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+    ]
+    for service, seconds in sorted(metrics.external_time.items()):
+        entries.append(
+            f'{service};dur={seconds * 1000:.1f};desc="{metrics.external_calls[service]} calls"'
+        )
+    entries.append(f"total;dur={metrics.elapsed * 1000:.1f}")
+    return ", ".join(entries)
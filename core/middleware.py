@@ -1,18 +1,103 @@
-# import logging
+import logging
+from urllib.parse import parse_qs
 
-# logger = logging.getLogger("django.request")
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
-# class RequestLogMiddleware:
-#     def __init__(self, get_response):
-#         self.get_response = get_response
+from .authentication import CachedJWTAuthentication
+from .metrics import RequestMetrics, current_request, registry, server_timing
 
-#     def __call__(self, request):
-#         response = self.get_response(request)
+logger = logging.getLogger("django.request")
 
-#         logger.info(
-#             "%s %s %s",
-#             request.method,
-#             request.path,
-#             response.status_code
-#         )
-#         return response
+
+# REQUEST INSTRUMENTATION
+# Per-route latency, DB query count/time, cache hits/misses and outbound
+# HTTP time (see core/metrics.py). Every response gets a Server-Timing
+# header, totals are served by /api/metrics/. Works for sync and async views.
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "unmatched"
+
+        registry.observe_request(route, request.method, response.status_code, metrics)
+        response["Server-Timing"] = server_timing(metrics)
+
+        # Every request at INFO would flood the logs; only slow ones stand out
+        slow = metrics.elapsed * 1000 >= settings.SLOW_REQUEST_MS
+        logger.log(
+            logging.WARNING if slow else logging.DEBUG,
+            "%s %s %s %.1fms %s queries",
+            request.method,
+            request.path,
+            response.status_code,
+            metrics.elapsed * 1000,
+            metrics.db_queries,
+        )
+        return response
+
+
+# WEBSOCKET JWT AUTH
+# Browsers can't set an Authorization header on a WebSocket handshake, so
+# the frontend passes its access token as ws/notifications/?token=<jwt>.
+# Connections without a token fall back to the session user.
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    authentication = CachedJWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        token = query.get("token", [None])[0]
+
+        if token:
+            scope["user"] = await get_user_for_token(token)
+
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_notification_actor_alter_notification_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['-updated_at', '-id'], name='task_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', '-updated_at', '-id'], name='task_status_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskcompletion',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, upload_to='proofs/thumbs/'),
+        ),
+    ]
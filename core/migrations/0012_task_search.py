@@ -0,0 +1,90 @@
+# Generated by Django 5.2.9 on 2026-10-17 16:10
+
+from django.db import migrations
+
+
+# Vendor specific full-text index for Task.title / Task.description (see
+# core/search.py). The SQL is frozen here rather than imported, so later
+# edits to the app can't change what this migration does.
+
+POSTGRES_INSTALL = [
+    """
+    ALTER TABLE core_task ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX task_search_idx ON core_task USING GIN (search_vector)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS task_search_idx",
+    "ALTER TABLE core_task DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_task_fts USING fts5(
+        title, description, content='core_task', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_insert AFTER INSERT ON core_task BEGIN
+        INSERT INTO core_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_delete AFTER DELETE ON core_task BEGIN
+        INSERT INTO core_task_fts(core_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_update AFTER UPDATE OF title, description ON core_task BEGIN
+        INSERT INTO core_task_fts(core_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO core_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO core_task_fts(core_task_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS core_task_fts_insert",
+    "DROP TRIGGER IF EXISTS core_task_fts_delete",
+    "DROP TRIGGER IF EXISTS core_task_fts_update",
+    "DROP TABLE IF EXISTS core_task_fts",
+]
+
+
+def run_for_vendor(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def install_search_index(apps, schema_editor):
+    run_for_vendor(schema_editor, {
+        'postgresql': POSTGRES_INSTALL,
+        'sqlite': SQLITE_INSTALL,
+    })
+
+
+def uninstall_search_index(apps, schema_editor):
+    run_for_vendor(schema_editor, {
+        'postgresql': POSTGRES_UNINSTALL,
+        'sqlite': SQLITE_UNINSTALL,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
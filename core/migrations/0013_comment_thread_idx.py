@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-17 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_task_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=models.Index(fields=['task', 'created_at', 'id'], name='comment_thread_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-17 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_archivedtask_archivednotification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='topic',
+            field=models.CharField(choices=[('task_transition', 'Task Transition'), ('stripe_event', 'Stripe Event'), ('proof_upload', 'Proof Upload')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='PendingProofUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_name', models.CharField(max_length=255)),
+                ('image', models.BinaryField()),
+                ('thumbnail_name', models.CharField(max_length=255)),
+                ('thumbnail', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pending_upload', to='core.taskcompletion')),
+            ],
+        ),
+    ]
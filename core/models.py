@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 
 # UserProfile extends Django's built-in User model to store
@@ -56,6 +57,16 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the task feed (core/pagination.py)
+            models.Index(fields=['-updated_at', '-id'], name='task_feed_idx'),
+            models.Index(fields=['status', '-updated_at', '-id'], name='task_status_feed_idx'),
+            # type=posted/claimed/completed/history and the dashboards
+            models.Index(fields=['created_by', 'status', '-updated_at'], name='task_creator_status_idx'),
+            models.Index(fields=['claimed_by', 'status', '-updated_at'], name='task_worker_status_idx'),
+        ]
+
 
 class TaskCompletion(models.Model):
     task = models.OneToOneField(
@@ -70,6 +81,7 @@ class TaskCompletion(models.Model):
     )
 
     proof_image = models.ImageField(upload_to='proofs/')
+    proof_thumbnail = models.ImageField(upload_to='proofs/thumbs/', blank=True)
     completion_details = models.TextField()
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -93,6 +105,12 @@ class TaskComment(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Comment thread pages (keyset on created_at, id)
+            models.Index(fields=['task', 'created_at', 'id'], name='comment_thread_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user} on Task {self.task.id}"
 
@@ -112,11 +130,37 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Bulk payouts share one intent across several tasks, so the
+            # intent id is unique per task. The index also serves the
+            # webhook's lookup by intent id.
+            models.UniqueConstraint(
+                fields=['stripe_payment_intent_id', 'task'],
+                name='payment_intent_task_unique',
+            ),
+        ]
     
     def __str__(self):
         return f"Payment {self.id} for Task {self.task.id}"
 
 
+# Stripe webhook ledger
+# One row per Stripe event id. Stripe retries and duplicate deliveries hit
+# the existing row and are acknowledged without redoing any work.
+class StripeEvent(models.Model):
+    event_id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+
 # Notifications
 class Notification(models.Model):
 
@@ -154,4 +198,160 @@ class Notification(models.Model):
 
     is_read = models.BooleanField(default=False)
 
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Inbox: NotificationListView
+            models.Index(fields=['recipient', '-created_at'], name='notification_inbox_idx'),
+            # Rebuilding the cached unread counter only scans unread rows
+            models.Index(
+                fields=['recipient'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+        ]
+
+
+# Transactional outbox
+# Side effects of a state change (notifications, websocket pushes,
+# recommendation updates, proof uploads) are written here in the same
+# transaction as the change and performed later by `manage.py dispatch_outbox`.
+class OutboxEvent(models.Model):
+    TOPIC_CHOICES = [
+        ('task_transition', 'Task Transition'),
+        ('stripe_event', 'Stripe Event'),
+        ('proof_upload', 'Proof Upload'),
+    ]
+
+    topic = models.CharField(max_length=50, choices=TOPIC_CHOICES)
+    payload = models.JSONField()
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Not claimed again before this: retry backoff, or the lease of an
+    # event whose handler runs outside the dispatcher's transaction
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
+
+
+# Deferred proof uploads (SUPABASE_DEFERRED_UPLOADS)
+# The processed images wait here, committed with the completion, until the
+# outbox dispatcher has stored them; the row is deleted once they are.
+class PendingProofUpload(models.Model):
+    completion = models.OneToOneField(
+        TaskCompletion,
+        on_delete=models.CASCADE,
+        related_name='pending_upload'
+    )
+
+    image_name = models.CharField(max_length=255)
+    image = models.BinaryField()
+    thumbnail_name = models.CharField(max_length=255)
+    thumbnail = models.BinaryField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending proof upload for completion {self.completion_id}"
+
+
+
+# Archive
+# Cold rows moved out of the hot tables by `manage.py archive_cold_data`
+# (see core/archive.py): paid tasks, with their completion, comments and
+# payments as JSON snapshots, and old read notifications. Original ids are
+# kept, so links and pagination cursors stay valid across the move.
+class ArchivedTask(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+
+    created_by = models.ForeignKey(
+        User,
+        related_name='archived_tasks_created',
+        on_delete=models.CASCADE
+    )
+
+    claimed_by = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        related_name='archived_tasks_claimed',
+        on_delete=models.CASCADE
+    )
+
+    # Always 'paid' today; kept so Task aggregates work on both tables
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES, default='paid')
+    duration_minutes = models.IntegerField(default=15)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    completion = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    comments = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    payments = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # type=history pages and the dashboards
+            models.Index(fields=['created_by', '-updated_at', '-id'], name='archived_task_creator_idx'),
+            models.Index(fields=['claimed_by', '-updated_at', '-id'], name='archived_task_worker_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class ArchivedNotification(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_notifications'
+    )
+
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+
+    # Plain values: the task may be archived (or gone) itself
+    task_id = models.BigIntegerField(null=True, blank=True)
+    task_title = models.CharField(max_length=200, blank=True)
+
+    type = models.CharField(max_length=30, choices=Notification.TYPE_CHOICES)
+    message = models.TextField()
+    is_read = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='archived_notification_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} -> {self.recipient} (archived)"
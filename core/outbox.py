@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .recommendations import apply_task_transitions
+from .services import (
+    create_notifications_bulk,
+    process_stripe_event,
+    upload_pending_proof_images,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# OUTBOX DISPATCHER
+# Claims a batch of pending events with SELECT ... FOR UPDATE SKIP LOCKED,
+# so several dispatchers can run side by side without double processing,
+# and performs their side effects in bulk. Events are marked processed in
+# the same transaction, so a crash just leaves them pending for a retry.
+# A failed event waits OUTBOX_RETRY_DELAY seconds, doubling per attempt,
+# before it is claimed again.
+#
+# Handlers of EXTERNAL_TOPICS call slow external services, which must not
+# hold the batch transaction (and its row locks) open. Their events are
+# leased instead: the claim commits with next_attempt_at pushed
+# OUTBOX_LEASE_SECONDS ahead, the handler runs outside any transaction and
+# commits its own writes, and the events are marked afterwards. If the
+# dispatcher dies meanwhile, the lease runs out and they are claimed again.
+#
+# Dashboard counters are not touched here: they are adjusted when the
+# transition itself commits (see services.record_task_transitions_bulk).
+
+# to_status -> (notification type, recipient field in the payload, message)
+TRANSITION_NOTIFICATIONS = {
+    'claimed': ('task_claimed', 'created_by_id', "Task '{title}' has been claimed."),
+    'completed': ('task_completed', 'created_by_id', "Task '{title}' has been completed."),
+    'approved': ('task_approved', 'claimed_by_id', "Task '{title}' has been approved."),
+    'paid': ('task_paid', 'claimed_by_id', "Task '{title}' has been paid."),
+}
+
+
+def handle_task_transitions(events):
+    notifications = []
+
+    for event in events:
+        payload = event.payload
+        rule = TRANSITION_NOTIFICATIONS.get(payload["to_status"])
+
+        if rule:
+            type, recipient_field, message = rule
+            if payload[recipient_field]:
+                notifications.append({
+                    "recipient_id": payload[recipient_field],
+                    "task_id": payload["task_id"],
+                    "actor_id": payload["actor_id"],
+                    "type": type,
+                    "message": message.format(title=payload["title"]),
+                })
+
+    create_notifications_bulk(notifications)
+
+    # Best effort: lists are rebuilt in batch anyway (build_recommendations)
+    payloads = [event.payload for event in events]
+    transaction.on_commit(lambda: apply_task_transitions(payloads), robust=True)
+
+
+def handle_stripe_events(events):
+    for event in events:
+        process_stripe_event(event.payload["event_id"])
+
+
+def handle_proof_uploads(events):
+    upload_pending_proof_images([event.payload["upload_id"] for event in events])
+
+
+HANDLERS = {
+    'task_transition': handle_task_transitions,
+    'stripe_event': handle_stripe_events,
+    'proof_upload': handle_proof_uploads,
+}
+
+EXTERNAL_TOPICS = {'proof_upload'}
+
+
+def run_handler(topic, events):
+    if topic in EXTERNAL_TOPICS:
+        HANDLERS[topic](events)
+        return
+
+    # Savepoint, so a failing handler doesn't poison the batch transaction
+    with transaction.atomic():
+        HANDLERS[topic](events)
+
+
+def run_events(events):
+    """
+    Run the handlers topic by topic, retrying a failed batch one event at a
+    time. Returns (processed, [(event, error), ...]).
+    """
+    by_topic = defaultdict(list)
+    for event in events:
+        by_topic[event.topic].append(event)
+
+    processed, failed = [], []
+    for topic, topic_events in by_topic.items():
+        try:
+            run_handler(topic, topic_events)
+            processed += topic_events
+            continue
+        except Exception:
+            logger.exception("Outbox batch for %s failed, retrying one by one", topic)
+
+        for event in topic_events:
+            try:
+                run_handler(topic, [event])
+                processed.append(event)
+            except Exception as e:
+                failed.append((event, repr(e)))
+
+    return processed, failed
+
+
+def retry_delay(attempts):
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOX_MAX_RETRY_DELAY))
+
+
+def mark_events(processed, failed):
+    now = timezone.now()
+
+    OutboxEvent.objects.filter(pk__in=[event.pk for event in processed]).update(
+        processed_at=now
+    )
+    for event, error in failed:
+        logger.error("Outbox event %s failed: %s", event.pk, error)
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            attempts=F('attempts') + 1,
+            last_error=error,
+            next_attempt_at=now + retry_delay(event.attempts + 1),
+        )
+
+
+def dispatch_outbox(batch_size=None):
+    """
+    Process one batch of pending events. Returns the number claimed.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    now = timezone.now()
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        external = [event for event in events if event.topic in EXTERNAL_TOPICS]
+        if external:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in external]).update(
+                next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            )
+
+        mark_events(*run_events([event for event in events if event.topic not in EXTERNAL_TOPICS]))
+
+    if external:
+        mark_events(*run_events(external))
+
+    return len(events)
+
+
+def purge_processed_outbox():
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,224 @@
+import base64
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# KEYSET (CURSOR) PAGINATION
+# Unlike offset pagination, every page is fetched with a
+# "WHERE (sort_key, id) < (last_sort_key, last_id) LIMIT n" query,
+# so page 500 costs the same as page 1 as long as an index on
+# (sort_key, id) exists.
+#
+# The cursor is an opaque url-safe base64 string of "<sort_key>|<id>"
+# taken from the last row of the previous page.
+#
+# Endpoints that predate pagination set opt_in_query_param: they keep
+# returning a bare list unless the client asks for pages with
+# ?<opt_in_query_param>=1 (or follows a `next` link, which has a cursor).
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    opt_in_query_param = None
+
+    # (timestamp field, tie-breaker field). Prefix with '-' for descending.
+    ordering = ('-updated_at', '-id')
+
+    page_size = 20
+    max_page_size = 100
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        if self.opt_in_query_param is None:
+            return True
+
+        params = request.query_params
+        return (
+            self.cursor_query_param in params
+            or params.get(self.opt_in_query_param, '').lower() in ('1', 'true')
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # For async views: same query, fetched without blocking the event loop
+        if not self.is_requested(request):
+            return None
+
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([obj async for obj in queryset])
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        One page across several querysets with the same ordering fields,
+        e.g. a table and its archive: each contributes at most a page, then
+        the rows are merged. Both ordering fields must share a direction.
+        """
+        if not self.is_requested(request):
+            return None
+
+        results = []
+        for queryset in querysets:
+            results += self.get_page_queryset(queryset, request)
+
+        results.sort(key=self.get_cursor_values, reverse=self.ordering[0].startswith('-'))
+        return self.set_page(results[:self.page_size + 1])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+
+        # Fetch one extra row to know whether a next page exists
+        # without running a separate COUNT query.
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                pass
+
+        if page_size <= 0:
+            page_size = self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_cursor_filter(self, cursor):
+        position, pk = cursor
+        sort_field, pk_field = (field.lstrip('-') for field in self.ordering)
+        lookup = 'lt' if self.ordering[0].startswith('-') else 'gt'
+
+        return (
+            Q(**{f'{sort_field}__{lookup}': position})
+            | Q(**{sort_field: position, f'{pk_field}__{lookup}': pk})
+        )
+
+    def get_cursor_values(self, instance):
+        sort_field, pk_field = (field.lstrip('-') for field in self.ordering)
+        return getattr(instance, sort_field), getattr(instance, pk_field)
+
+    def encode_cursor(self, instance):
+        position, pk = self.get_cursor_values(instance)
+        raw = f'{position.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            position, pk = raw.rsplit('|', 1)
+            position = parse_datetime(position)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+# Task feed: newest activity first, matches the (updated_at, id) indexes on Task.
+# /tasks/ was a bare list before, so pages are opt-in with ?paginate=1.
+class TaskFeedPagination(KeysetPagination):
+    opt_in_query_param = 'paginate'
+    ordering = ('-updated_at', '-id')
+    page_size = settings.TASK_FEED_PAGE_SIZE
+    max_page_size = settings.TASK_FEED_MAX_PAGE_SIZE
+
+
+# Archived notifications: newest first, matches archived_notification_idx.
+class ArchivedNotificationPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    page_size = settings.TASK_FEED_PAGE_SIZE
+    max_page_size = settings.TASK_FEED_MAX_PAGE_SIZE
+
+
+# Comment threads: oldest first, so the last page's `next` link is where a
+# chat client resumes. Matches the (task, created_at, id) index.
+class TaskCommentPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+    page_size = settings.COMMENT_PAGE_SIZE
+    max_page_size = settings.COMMENT_MAX_PAGE_SIZE
+
+
+# Task search: ordered by relevance, which no index can seek on, so results
+# page by offset. Like the keyset pages, one extra row tells whether a next
+# page exists instead of a COUNT over every match.
+class TaskSearchPagination(LimitOffsetPagination):
+    default_limit = settings.TASK_FEED_PAGE_SIZE
+    max_limit = settings.TASK_FEED_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = replace_query_param(
+            self.request.build_absolute_uri(), self.limit_query_param, self.limit
+        )
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return KeysetPagination.get_paginated_response_schema(self, schema)
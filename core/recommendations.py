@@ -0,0 +1,344 @@
+from collections import Counter, defaultdict
+import json
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django_redis import get_redis_connection
+
+from .models import ArchivedTask, Task, UserProfile
+
+
+# WORKER RECOMMENDATIONS
+# Every worker has a precomputed candidate list of open tasks, a Redis
+# sorted set "recommend:worker:<id>" (task id -> score) capped at
+# RECOMMENDATION_LIST_SIZE, next to a profile of their history
+# ("recommend:profile:<id>": typical price and duration, the businesses
+# they worked with and how those tasks ended).
+#
+# - `manage.py build_recommendations` rebuilds all lists in batch.
+# - The outbox dispatcher keeps them current: a new task is scored into
+#   every existing list, and a worker's own claims / approvals / payments
+#   rebuild their profile and list (see apply_task_transitions()).
+# - Claimed or deleted tasks are not removed from every list eagerly; the
+#   read path filters them out and drops them from the set it read.
+# - A list that expired or was never built is built on first read.
+#
+# "recommend:workers" is the set of workers that have a list, i.e. the
+# ones a new task has to be fanned out to.
+
+WORKERS_KEY = "recommend:workers"
+
+# History statuses that count as a successful outcome
+SUCCESSFUL_STATUSES = ('approved', 'paid')
+
+# Weights of the score components, each in [0, 1]
+SCORE_WEIGHTS = {
+    "price": 0.35,
+    "duration": 0.25,
+    "business": 0.30,
+    "reliability": 0.10,
+}
+
+# Add to a list only if it exists (a missing list is built from the DB on
+# read, so it must not start out with a single task), then trim it.
+ADD_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[3]) - 1)
+    return 1
+end
+return 0
+"""
+
+
+def candidates_key(worker_id):
+    return f"recommend:worker:{worker_id}"
+
+
+def profile_key(worker_id):
+    return f"recommend:profile:{worker_id}"
+
+
+# PROFILES
+
+HISTORY_MODELS = (Task, ArchivedTask)  # paid tasks move to the archive
+
+
+def history_totals(worker_ids, *group_by):
+    """
+    {group_by values: totals} over the claimed tasks of both tables, one
+    grouped query per table. Sums rather than averages so the two merge.
+    """
+    totals = defaultdict(Counter)
+    for model in HISTORY_MODELS:
+        history = model.objects.filter(claimed_by__isnull=False)
+        if worker_ids is not None:
+            history = history.filter(claimed_by_id__in=worker_ids)
+
+        rows = (
+            history.values(*group_by)
+            .annotate(
+                claimed=Count("id"),
+                successful=Count("id", filter=Q(status__in=SUCCESSFUL_STATUSES)),
+                price=Sum("price"),
+                duration=Sum("duration_minutes"),
+            )
+            .order_by()
+        )
+        for row in rows:
+            totals[tuple(row.pop(field) for field in group_by)].update(row)
+    return totals
+
+
+def history_profiles(worker_ids=None):
+    """
+    {worker id: profile} from grouped queries over claimed tasks, live and
+    archived.
+    """
+    profiles = {}
+    for (worker_id,), row in history_totals(worker_ids, "claimed_by_id").items():
+        profiles[worker_id] = {
+            "claimed": row["claimed"],
+            "successful": row["successful"],
+            "avg_price": float(row["price"]) / row["claimed"],
+            "avg_duration": row["duration"] / row["claimed"],
+            "businesses": {},
+        }
+
+    # Affinity to a business: share of the worker's history with it,
+    # successful outcomes counting double.
+    for (worker_id, business_id), row in history_totals(worker_ids, "claimed_by_id", "created_by_id").items():
+        profile = profiles[worker_id]
+        weight = (row["claimed"] + row["successful"]) / (profile["claimed"] + profile["successful"])
+        profile["businesses"][str(business_id)] = round(weight, 4)
+
+    return profiles
+
+
+def default_profile():
+    """
+    Cold start: the marketplace-wide typical task, no business affinity.
+    """
+    def compute():
+        totals = Counter()
+        for model in HISTORY_MODELS:
+            totals.update(model.objects.aggregate(
+                count=Count("id"),
+                price=Coalesce(Sum("price"), Value(0), output_field=DecimalField()),
+                duration=Coalesce(Sum("duration_minutes"), Value(0)),
+            ))
+        count = totals["count"]
+        return {
+            "claimed": 0,
+            "successful": 0,
+            "avg_price": float(totals["price"]) / count if count else 1.0,
+            "avg_duration": totals["duration"] / count if count else 15.0,
+            "businesses": {},
+        }
+
+    return cache.get_or_set("recommend:default_profile", compute, settings.RECOMMENDATION_TTL)
+
+
+# SCORING
+
+def closeness(value, typical):
+    # 1 for the typical value, falling off with the log ratio (2x -> 0.59)
+    if value <= 0 or typical <= 0:
+        return 0.0
+    return 1 / (1 + abs(math.log(value / typical)))
+
+
+def score_task(task, profile):
+    """
+    task: dict with price, duration_minutes and created_by_id.
+    """
+    if profile["claimed"]:
+        reliability = profile["successful"] / profile["claimed"]
+    else:
+        reliability = 0.5
+
+    components = {
+        "price": closeness(float(task["price"]), profile["avg_price"]),
+        "duration": closeness(task["duration_minutes"], profile["avg_duration"]),
+        "business": profile["businesses"].get(str(task["created_by_id"]), 0.0),
+        # Proven workers get a nudge toward businesses they already know
+        "reliability": reliability if str(task["created_by_id"]) in profile["businesses"] else 0.0,
+    }
+    return round(sum(SCORE_WEIGHTS[name] * value for name, value in components.items()), 6)
+
+
+def open_task_rows():
+    return list(
+        Task.objects.filter(status='open')
+        .values("id", "price", "duration_minutes", "created_by_id")
+    )
+
+
+def top_candidates(tasks, profile, worker_id):
+    scored = [
+        (score_task(task, profile), task["id"])
+        for task in tasks
+        if task["created_by_id"] != worker_id  # never their own task
+    ]
+    scored.sort(reverse=True)
+    return scored[:settings.RECOMMENDATION_LIST_SIZE]
+
+
+# BUILDING LISTS
+
+def store_recommendations(pipe, worker_id, profile, candidates):
+    ttl = settings.RECOMMENDATION_TTL
+    key = candidates_key(worker_id)
+
+    pipe.set(profile_key(worker_id), json.dumps(profile), ex=ttl)
+    pipe.delete(key)
+    if candidates:
+        pipe.zadd(key, {task_id: score for score, task_id in candidates})
+    else:
+        pipe.zadd(key, {0: 0})  # placeholder so an empty list still "exists"
+    pipe.expire(key, ttl)
+    pipe.sadd(WORKERS_KEY, worker_id)
+
+
+def build_recommendations(worker_ids, tasks=None):
+    """
+    Rebuild the profiles and lists of `worker_ids`. Returns the count built.
+    """
+    worker_ids = list(worker_ids)
+    if not worker_ids:
+        return 0
+
+    tasks = open_task_rows() if tasks is None else tasks
+    profiles = history_profiles(worker_ids)
+    fallback = default_profile() if len(profiles) < len(worker_ids) else None
+
+    # MULTI/EXEC: readers never see a list between DELETE and ZADD
+    pipe = get_redis_connection("default").pipeline(transaction=True)
+    for worker_id in worker_ids:
+        profile = profiles.get(worker_id, fallback)
+        store_recommendations(pipe, worker_id, profile, top_candidates(tasks, profile, worker_id))
+    pipe.execute()
+
+    return len(worker_ids)
+
+
+def build_all_recommendations(chunk_size=500):
+    """
+    Batch job: every worker with a history or an existing list.
+    """
+    redis = get_redis_connection("default")
+    known = {int(worker_id) for worker_id in redis.smembers(WORKERS_KEY)}
+    with_history = {
+        worker_id
+        for model in HISTORY_MODELS
+        for worker_id in model.objects.filter(claimed_by__isnull=False)
+        .values_list("claimed_by_id", flat=True).order_by().distinct()
+    }
+    workers = set(
+        UserProfile.objects.filter(role='worker', user_id__in=known | with_history)
+        .values_list("user_id", flat=True)
+    )
+
+    # Workers whose account or role is gone drop out of the fan-out set
+    stale = known - workers
+    if stale:
+        redis.srem(WORKERS_KEY, *stale)
+
+    tasks = open_task_rows()
+    built = 0
+    worker_list = sorted(workers)
+    for start in range(0, len(worker_list), chunk_size):
+        built += build_recommendations(worker_list[start:start + chunk_size], tasks)
+    return built
+
+
+# INCREMENTAL UPDATES
+
+def add_task_to_lists(task):
+    """
+    Score a newly opened task into every existing list.
+    """
+    redis = get_redis_connection("default")
+    worker_ids = [int(worker_id) for worker_id in redis.smembers(WORKERS_KEY)]
+    if not worker_ids:
+        return
+
+    profiles = redis.mget([profile_key(worker_id) for worker_id in worker_ids])
+    add = redis.register_script(ADD_IF_EXISTS)
+
+    pipe = redis.pipeline(transaction=False)
+    targets = []
+    for worker_id, profile in zip(worker_ids, profiles):
+        if profile is None or worker_id == task["created_by_id"]:
+            continue
+        score = score_task(task, json.loads(profile))
+        add(
+            keys=[candidates_key(worker_id)],
+            args=[score, task["id"], settings.RECOMMENDATION_LIST_SIZE],
+            client=pipe,
+        )
+        targets.append(worker_id)
+
+    expired = [worker_id for worker_id, added in zip(targets, pipe.execute()) if not added]
+    if expired:
+        redis.srem(WORKERS_KEY, *expired)
+
+
+def apply_task_transitions(payloads):
+    """
+    Called by the outbox dispatcher (after commit) with task_transition
+    payloads.
+    """
+    changed_workers = set()
+
+    for payload in payloads:
+        if payload["from_status"] is None and payload["to_status"] == 'open':
+            add_task_to_lists({
+                "id": payload["task_id"],
+                "price": payload["price"],
+                # Absent from payloads recorded before it was added
+                "duration_minutes": payload.get("duration_minutes", 15),
+                "created_by_id": payload["created_by_id"],
+            })
+        elif payload["to_status"] in ('claimed', 'approved', 'paid') and payload["claimed_by_id"]:
+            changed_workers.add(payload["claimed_by_id"])
+
+    if changed_workers:
+        build_recommendations(changed_workers)
+
+
+# READING
+
+def recommended_tasks(worker_id, limit):
+    """
+    Up to `limit` open tasks for the worker, best first, with their score.
+    """
+    redis = get_redis_connection("default")
+    key = candidates_key(worker_id)
+
+    if not redis.exists(key):
+        build_recommendations([worker_id])
+
+    # Read a margin past `limit`: some entries may have been claimed since
+    entries = redis.zrevrange(key, 0, limit * 2 - 1, withscores=True)
+    scores = {int(task_id): score for task_id, score in entries if int(task_id)}
+
+    tasks = {
+        task.id: task
+        for task in Task.objects.filter(id__in=scores, status='open')
+        .exclude(created_by_id=worker_id)
+        .select_related('created_by', 'claimed_by')
+    }
+
+    # Lazily drop what is no longer open
+    gone = [task_id for task_id in scores if task_id not in tasks]
+    if gone:
+        redis.zrem(key, *gone)
+
+    ranked = sorted(tasks.values(), key=lambda task: (-scores[task.id], -task.id))[:limit]
+    for task in ranked:
+        task.score = scores[task.id]
+    return ranked
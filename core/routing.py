@@ -1,6 +1,6 @@
-# from django.urls import path
-# from .consumers import NotificationConsumer
+from django.urls import path
+from .consumers import NotificationConsumer
 
-# websocket_urlpatterns = [
-#     path("ws/notifications/", NotificationConsumer.as_asgi()),
-# ]
+websocket_urlpatterns = [
+    path("ws/notifications/", NotificationConsumer.as_asgi()),
+]
@@ -0,0 +1,120 @@
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+# FULL-TEXT TASK SEARCH
+# Task.title / Task.description are indexed outside the ORM, per database:
+#
+# PostgreSQL: a generated, stored tsvector column (title weighted above
+#   description) with a GIN index. The database recomputes it on every
+#   INSERT/UPDATE, so it can't drift from the row.
+# SQLite: an external-content FTS5 table kept in sync by triggers.
+#   Rebuilding core_task (SQLite ALTER TABLE emulation) drops the triggers,
+#   so they are re-created after every migrate (see apps.py).
+# Anything else falls back to an unindexed icontains search.
+#
+# The column / table are created by migration 0012_task_search, whose SQL
+# must stay in step with SEARCH_CONFIG and SQLITE_TRIGGERS below.
+
+SEARCH_CONFIG = 'english'
+
+# Copies of the triggers migration 0012 installs; keep them identical
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_insert AFTER INSERT ON core_task BEGIN
+        INSERT INTO core_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_delete AFTER DELETE ON core_task BEGIN
+        INSERT INTO core_task_fts(core_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    # Only a change to the indexed text needs the index touched
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_update AFTER UPDATE OF title, description ON core_task BEGIN
+        INSERT INTO core_task_fts(core_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO core_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+def restore_sqlite_triggers(sender, using, **kwargs):
+    """
+    post_migrate: put back FTS triggers lost to a core_task table rebuild
+    and reindex what was written meanwhile.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+
+    with conn.cursor() as cursor:
+        tables = conn.introspection.table_names(cursor)
+        if 'core_task_fts' not in tables:
+            return  # 0012_task_search not applied (yet)
+
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'core_task_fts_%'"
+        )
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+            return
+
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
+        cursor.execute("INSERT INTO core_task_fts(core_task_fts) VALUES ('rebuild')")
+
+
+def fts5_query(text):
+    # Every word as a quoted phrase (AND-ed), so FTS5 operators and
+    # punctuation in user input can't break the query. The last word
+    # is a prefix match for search-as-you-type.
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def search_tasks(queryset, text):
+    """
+    Filter a Task queryset to matches for `text`, annotated with `rank`
+    (higher is better) and ordered by it.
+    """
+    vendor = connection.vendor
+
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        queryset = queryset.filter(
+            RawSQL(f"core_task.search_vector @@ {tsquery}", (text,), output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f"ts_rank_cd(core_task.search_vector, {tsquery})", (text,), output_field=FloatField())
+        )
+
+    elif vendor == 'sqlite':
+        match = fts5_query(text)
+        if not match:
+            return queryset.none()
+
+        queryset = queryset.filter(
+            id__in=RawSQL("SELECT rowid FROM core_task_fts WHERE core_task_fts MATCH %s", (match,))
+        ).annotate(
+            # bm25(): lower is better; title weighted above description
+            rank=RawSQL(
+                "(SELECT -bm25(core_task_fts, 10.0, 1.0) FROM core_task_fts "
+                "WHERE core_task_fts MATCH %s AND core_task_fts.rowid = core_task.id)",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+
+    else:
+        queryset = queryset.filter(
+            Q(title__icontains=text) | Q(description__icontains=text)
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.order_by('-rank', '-updated_at', '-id')
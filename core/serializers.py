@@ -1,8 +1,26 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
 from .models import *
 
 
+# Eager loading
+# Each serializer declares the relations it renders so list/detail views
+# can join or prefetch them up front (see EagerLoadingQuerysetMixin in
+# views.py) instead of issuing one query per nested object.
+class EagerLoadingMixin:
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+
 # User
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,10 +29,12 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # Task
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
     claimed_by = UserSerializer(read_only=True)
 
+    select_related_fields = ('created_by', 'claimed_by')
+
     class Meta:
         model = Task
         fields = [
@@ -51,6 +71,7 @@ class TaskCompletionSerializer(serializers.ModelSerializer):
             'task',
             'completed_by',
             'proof_image',
+            'proof_thumbnail',
             'completion_details',
             'created_at',
         ]
@@ -58,13 +79,16 @@ class TaskCompletionSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id',
             'completed_by',
+            'proof_thumbnail',
             'created_at',
         ]
 
 # Task comment
-class TaskCommentSerializer(serializers.ModelSerializer):
+class TaskCommentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
+    select_related_fields = ('user',)
+
     class Meta:
         model = TaskComment
         fields = [
@@ -81,11 +105,48 @@ class TaskCommentSerializer(serializers.ModelSerializer):
         ]
 
 
+# Task search
+# Query string of /tasks/search/
+class TaskSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, default='open')
+    min_price = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    min_duration = serializers.IntegerField(min_value=0, required=False)
+    max_duration = serializers.IntegerField(min_value=0, required=False)
+
+
+class TaskSearchResultSerializer(TaskSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(TaskSerializer.Meta):
+        fields = TaskSerializer.Meta.fields + ['rank']
+
+
+# Recommended tasks for a worker
+class TaskRecommendationSerializer(TaskSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(TaskSerializer.Meta):
+        fields = TaskSerializer.Meta.fields + ['score']
+
+
 # Task Detail
 class TaskDetailSerializer(TaskSerializer):
     completion = TaskCompletionSerializer(read_only=True)
     comments = TaskCommentSerializer(many=True, read_only=True)
 
+    select_related_fields = TaskSerializer.select_related_fields + (
+        'completion',
+        'completion__completed_by',
+    )
+    prefetch_related_fields = (
+        Prefetch(
+            'comments',
+            queryset=TaskComment.objects.select_related('user').order_by('created_at', 'id'),
+        ),
+    )
+
     class Meta(TaskSerializer.Meta):
         fields = TaskSerializer.Meta.fields + [
             'completion',
@@ -192,10 +253,12 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     actor = serializers.SerializerMethodField()
     task = serializers.SerializerMethodField()
 
+    select_related_fields = ('actor', 'task')
+
     class Meta:
         model = Notification
         fields = [
@@ -222,4 +285,30 @@ class NotificationSerializer(serializers.ModelSerializer):
                 "id": obj.task.id,
                 "title": obj.task.title
             }
-        return None
\ No newline at end of file
+        return None
+
+
+# Archived notification: same shape, the task is stored as plain values
+class ArchivedNotificationSerializer(NotificationSerializer):
+    select_related_fields = ('actor',)
+
+    class Meta(NotificationSerializer.Meta):
+        model = ArchivedNotification
+
+    def get_task(self, obj):
+        if obj.task_id:
+            return {
+                "id": obj.task_id,
+                "title": obj.task_title
+            }
+        return None
+
+
+# Batch request body: {"ids": [1, 2, 3]}
+# Used by batch mark-as-read and the bulk task actions.
+class IdListSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000,
+    )
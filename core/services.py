@@ -1,88 +1,952 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+import hashlib
+import logging
+import time
+
+from django.conf import settings
 from django.core.cache import cache
-from .models import Task, User, Notification
-from django.db.models import Sum
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django_redis import get_redis_connection
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+import requests
+import stripe
 
-def business_dashboard_stats(user_id):
-    key = f"dashboard:business:{user_id}"
-    data = cache.get(key)
+from .images import InvalidImage, process_proof_image
+from .models import (
+    ArchivedTask, Task, TaskCompletion, User, Notification, OutboxEvent, Payment,
+    PendingProofUpload, StripeEvent,
+)
+from .serializers import NotificationSerializer, TaskDetailSerializer, TaskSerializer
+from .metrics import instrument_session, record_cache, timed_external
+
+
+logger = logging.getLogger(__name__)
+
+# TASK TRANSITIONS
+# Views write an outbox row in the same transaction as the status change;
+# notifications and pushes are performed by the outbox dispatcher
+# (core/outbox.py, `manage.py dispatch_outbox`). Dashboard counters are
+# adjusted as soon as the transaction commits instead: a dashboard rebuilt
+# from the DB in between would already include the change, and a delta
+# applied by the dispatcher later would count it twice.
+
+def record_task_transition(task, from_status, to_status, actor=None):
+    """
+    Must be called inside the transaction that changes `task`.
+    from_status / to_status are None when the task is created / deleted.
+    """
+    record_task_transitions_bulk([task], from_status, to_status, actor)
+
+
+def record_task_transitions_bulk(tasks, from_status, to_status, actor=None):
+    """
+    record_task_transition() for many tasks with a single INSERT and one
+    counter update per dashboard.
+    """
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            topic="task_transition",
+            payload=task_transition_payload(task, from_status, to_status, actor),
+        )
+        for task in tasks
+    ])
+
+    deltas = defaultdict(Counter)
+    for task in tasks:
+        bump_task_version(task.id)
+
+        task_deltas = dashboard_deltas(
+            task.created_by_id, task.claimed_by_id, task.price, from_status, to_status
+        )
+        for key, delta in task_deltas.items():
+            deltas[key].update(delta)
+
+    # Redis being down must not fail a request that has already committed
+    transaction.on_commit(lambda: apply_dashboard_deltas(deltas), robust=True)
+
+
+def task_transition_payload(task, from_status, to_status, actor=None):
+    return {
+        "task_id": task.id,
+        "title": task.title,
+        "price": str(task.price),
+        "duration_minutes": task.duration_minutes,
+        "created_by_id": task.created_by_id,
+        "claimed_by_id": task.claimed_by_id,
+        "from_status": from_status,
+        "to_status": to_status,
+        "actor_id": actor.id if actor else None,
+    }
+
+
+# VERSION COUNTERS
+# A version is a Redis integer bumped after commit by whatever changes the
+# data it covers. It is a cheap validator: readers compare it instead of
+# the data. An evicted version restarts from the current time in ns,
+# never repeating an old one.
+
+def cached_version(key, timeout):
+    version = cache.get(key)
+
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout):
+            version = cache.get(key, version)  # Another request created it
+
+    return version
+
+
+async def acached_version(key, timeout):
+    version = await cache.aget(key)
+
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout):
+            version = await cache.aget(key, version)
+
+    return version
+
+
+def bump_versions(*keys):
+    def apply():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass  # Not cached: the next read starts a new version
+
+    # Like the dashboard deltas: Redis being down must not stop the other
+    # on_commit callbacks of the transition
+    transaction.on_commit(apply, robust=True)
+
+
+# TASK DETAIL CACHE
+# Serialized task details (task + completion + comments) are cached under a
+# per-task version, "task:<id>:detail:<version>". Whatever changes the
+# detail (transitions, comments, proof uploads) bumps "task:<id>:version"
+# after commit, so stale payloads are never looked up again and simply
+# expire. The version doubles as the ETag of TaskDetailView and of the
+# task's comment thread.
+#
+# Every bump also moves "tasks:version", the validator of the task feed:
+# any task write may change some user's feed.
+
+TASK_FEED_VERSION_KEY = "tasks:version"
+
+
+def task_version_key(task_id):
+    return f"task:{task_id}:version"
+
+
+def task_detail_key(task_id, version):
+    return f"task:{task_id}:detail:{version}"
+
+
+def task_version(task_id):
+    return cached_version(task_version_key(task_id), settings.TASK_DETAIL_CACHE_TTL)
+
+
+def task_feed_version():
+    return cached_version(TASK_FEED_VERSION_KEY, settings.TASK_DETAIL_CACHE_TTL)
+
+
+async def atask_feed_version():
+    return await acached_version(TASK_FEED_VERSION_KEY, settings.TASK_DETAIL_CACHE_TTL)
+
+
+def bump_task_version(task_id):
+    bump_versions(task_version_key(task_id), TASK_FEED_VERSION_KEY)
+
+
+def task_detail(task_id):
+    """
+    (payload, version) for the task, (None, None) if it doesn't exist.
+    The payload carries what can_view_task() needs next to the data.
+    """
+    version = task_version(task_id)
+    key = task_detail_key(task_id, version)
+    payload = cache.get(key)
+    record_cache("task_detail", payload is not None)
+
+    if payload is None:
+        task = TaskDetailSerializer.setup_eager_loading(
+            Task.objects.filter(pk=task_id)
+        ).first()
+
+        if task is not None:
+            data = TaskDetailSerializer(task).data
+        else:
+            # Archived tasks keep their completion and comments pre-rendered
+            task = TaskSerializer.setup_eager_loading(
+                ArchivedTask.objects.filter(pk=task_id)
+            ).first()
+            if task is None:
+                return None, None
+            data = {
+                **TaskSerializer(task).data,
+                "completion": task.completion,
+                "comments": task.comments,
+            }
+
+        payload = {
+            "status": task.status,
+            "created_by_id": task.created_by_id,
+            "claimed_by_id": task.claimed_by_id,
+            "data": data,
+        }
+        cache.set(key, payload, settings.TASK_DETAIL_CACHE_TTL)
+
+    return payload, version
+
+
+def can_view_task(payload, user):
+    # Same rule as TaskDetailView.get_queryset()
+    return (
+        payload["status"] == "open"
+        or user.id in (payload["created_by_id"], payload["claimed_by_id"])
+    )
+
+
+# STRIPE PAYMENTS
+# Pooled HTTP clients with a bounded timeout: RequestsClient keeps a
+# keep-alive session per thread, HTTPXClient serves the *_async calls.
+#
+# A set of tasks (one task, or a bulk payout) is paid by one PaymentIntent
+# with a pending Payment row per task. Paying the same set again reuses its
+# open intent, and new intents are created with an idempotency key, so
+# double clicks and client retries never create a second intent or Payment
+# row. Open intents covering a different set (a task paid alone after its
+# batch, or overlapping batches) are canceled and superseded, so no task
+# is left stuck behind an abandoned intent or paid twice. While an intent
+# is processing or has succeeded (webhook pending) paying again is refused.
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+stripe.default_http_client = stripe.RequestsClient(
+    timeout=settings.STRIPE_TIMEOUT,
+    session=instrument_session(requests.Session(), "stripe"),
+    async_fallback_client=stripe.HTTPXClient(timeout=settings.STRIPE_TIMEOUT),
+)
+
+# Intents in these states can still be confirmed by the frontend
+REUSABLE_INTENT_STATUSES = (
+    "requires_payment_method",
+    "requires_confirmation",
+    "requires_action",
+)
+
+
+class PaymentInProgress(Exception):
+    """
+    An intent for these tasks is processing or has succeeded and only waits
+    for its webhook. Another intent could charge the business twice.
+    """
+
+
+def payment_intent_params(tasks, user, attempt):
+    task_ids = sorted(task.id for task in tasks)
+    params = {
+        "amount": sum(to_minor_units(task.price) for task in tasks),  # in smallest currency unit
+        "currency": "inr",
+        "automatic_payment_methods": {"enabled": True},
+        "receipt_email": user.email,
+    }
+
+    # Stable per attempt: a retried request returns the same intent
+    if len(tasks) == 1:
+        params["description"] = f"Payment for task {tasks[0].title}"
+        params["idempotency_key"] = f"task-{tasks[0].id}-payment-{attempt}"
+    else:
+        batch = hashlib.sha1(",".join(map(str, task_ids)).encode()).hexdigest()[:16]
+        params["description"] = f"Payment for {len(tasks)} tasks"
+        params["metadata"] = {"task_ids": ",".join(map(str, task_ids))}
+        params["idempotency_key"] = f"tasks-{batch}-payment-{attempt}"
+
+    return params
+
+
+def open_payment_intents(task_ids):
+    """
+    Pending Payments of every intent that pays any of `task_ids`, as
+    (intent id, task id) rows.
+    """
+    pending = Payment.objects.filter(status="pending")
+    return pending.filter(
+        stripe_payment_intent_id__in=pending.filter(task_id__in=task_ids).values("stripe_payment_intent_id")
+    ).values_list("stripe_payment_intent_id", "task_id")
+
+
+def covered_tasks(rows):
+    covered = defaultdict(set)
+    for intent_id, task_id in rows:
+        covered[intent_id].add(task_id)
+    return covered
+
+
+def split_open_intents(intents, covered, task_ids):
+    """
+    (intent to reuse or None, intents to supersede) for paying `task_ids`.
+    Raises PaymentInProgress if any of them may already be charging.
+    """
+    for intent in intents:
+        if intent.status not in REUSABLE_INTENT_STATUSES + ("canceled",):
+            raise PaymentInProgress(intent.id)
+
+    reuse = next(
+        (
+            intent for intent in intents
+            if covered[intent.id] == task_ids and intent.status in REUSABLE_INTENT_STATUSES
+        ),
+        None,
+    )
+    return reuse, [intent for intent in intents if intent is not reuse]
+
+
+def new_payments(intent, tasks):
+    return [
+        Payment(
+            task=task,
+            stripe_payment_intent_id=intent.id,
+            amount=task.price,
+            status="pending",
+        )
+        for task in tasks
+    ]
+
+
+def get_or_create_payment_intent(tasks, user):
+    task_ids = {task.id for task in tasks}
+    covered = covered_tasks(open_payment_intents(task_ids))
+    intents = [stripe.PaymentIntent.retrieve(intent_id) for intent_id in covered]
+
+    reuse, stale = split_open_intents(intents, covered, task_ids)
+    for intent in stale:
+        if intent.status != "canceled":
+            try:
+                stripe.PaymentIntent.cancel(intent.id)
+            except stripe.InvalidRequestError:
+                raise PaymentInProgress(intent.id)  # confirmed in the meantime
+    Payment.objects.filter(
+        stripe_payment_intent_id__in=[intent.id for intent in stale], status="pending"
+    ).update(status="failed")
+
+    if reuse:
+        return reuse
+
+    attempt = Payment.objects.filter(task_id__in=task_ids).count()
+    intent = stripe.PaymentIntent.create(**payment_intent_params(tasks, user, attempt))
+
+    # Record payments in DB (status pending); a retried request finds them
+    Payment.objects.bulk_create(new_payments(intent, tasks), ignore_conflicts=True)
+    return intent
+
+
+async def aget_or_create_payment_intent(tasks, user):
+    task_ids = {task.id for task in tasks}
+    covered = covered_tasks([row async for row in open_payment_intents(task_ids)])
+    intents = []
+    for intent_id in covered:
+        with timed_external("stripe"):
+            intents.append(await stripe.PaymentIntent.retrieve_async(intent_id))
+
+    reuse, stale = split_open_intents(intents, covered, task_ids)
+    for intent in stale:
+        if intent.status != "canceled":
+            try:
+                with timed_external("stripe"):
+                    await stripe.PaymentIntent.cancel_async(intent.id)
+            except stripe.InvalidRequestError:
+                raise PaymentInProgress(intent.id)
+    await Payment.objects.filter(
+        stripe_payment_intent_id__in=[intent.id for intent in stale], status="pending"
+    ).aupdate(status="failed")
+
+    if reuse:
+        return reuse
+
+    attempt = await Payment.objects.filter(task_id__in=task_ids).acount()
+    with timed_external("stripe"):
+        intent = await stripe.PaymentIntent.create_async(**payment_intent_params(tasks, user, attempt))
+
+    await Payment.objects.abulk_create(new_payments(intent, tasks), ignore_conflicts=True)
+    return intent
+
+
+def payment_intent_response(intent, user, profile):
+    # client_secret + billing details for the frontend
+    return {
+        "client_secret": intent.client_secret,
+        "billing_details": {
+            "name": user.username,
+            "address": {
+                "line1": profile.address_line1,
+                "city": profile.city,
+                "country": profile.country,
+                "postal_code": profile.postal_code,
+            }
+        }
+    }
+
+
+# STRIPE WEBHOOK EVENTS
+# Every handled event is recorded in the StripeEvent ledger. Processing
+# locks the ledger row, so concurrent duplicate deliveries serialize and
+# only the first one does any work. With STRIPE_WEBHOOK_DEFERRED the
+# webhook only records the event and the outbox dispatcher processes it.
+
+def handle_payment_intent_succeeded(payload):
+    payments = (
+        Payment.objects
+        .select_for_update()
+        .select_related("task__created_by")
+        .filter(stripe_payment_intent_id=payload["payment_intent"])
+        .exclude(status="paid")
+    )
+
+    for payment in payments:
+        Payment.objects.filter(pk=payment.pk).update(status="paid")
+
+        task = payment.task
+        if task.status != "approved":
+            continue
+
+        task.status = "paid"
+        task.save(update_fields=["status", "updated_at"])
+
+        record_task_transition(task, 'approved', 'paid', actor=task.created_by)
+        logger.info("Task %s paid (intent %s)", task.id, payload["payment_intent"])
+
+
+STRIPE_EVENT_HANDLERS = {
+    "payment_intent.succeeded": handle_payment_intent_succeeded,
+}
+
+
+def stripe_event_payload(event):
+    if event["type"] == "payment_intent.succeeded":
+        return {"payment_intent": event["data"]["object"]["id"]}
+    return {}
+
+
+def record_stripe_event(event):
+    """
+    Add `event` to the ledger. Returns False if it was already recorded.
+    """
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event["id"],
+        defaults={
+            "type": event["type"],
+            "payload": stripe_event_payload(event),
+        },
+    )
+    return created
+
+
+def process_stripe_event(event_id):
+    """
+    Apply a recorded event exactly once. Returns False for duplicates.
+    """
+    with transaction.atomic():
+        ledger = StripeEvent.objects.select_for_update().get(pk=event_id)
+        if ledger.processed_at:
+            return False
+
+        STRIPE_EVENT_HANDLERS[ledger.type](ledger.payload)
+
+        ledger.processed_at = timezone.now()
+        ledger.save(update_fields=["processed_at"])
+
+    return True
 
-    if data:
-        return data
 
-    user = User.objects.get(id=user_id)
+def defer_stripe_event(event):
+    with transaction.atomic():
+        if record_stripe_event(event):
+            OutboxEvent.objects.create(
+                topic="stripe_event",
+                payload={"event_id": event["id"]},
+            )
 
-    total_paid_amount = (
-        Task.objects
-        .filter(created_by=user, status="paid")
-        .aggregate(total=Sum("price"))["total"] or 0
+
+# DASHBOARD COUNTERS
+# Each dashboard is a Redis hash ("dashboard:business:<id>" /
+# "dashboard:worker:<id>") that is built with one aggregate query on a
+# miss and then kept current with HINCRBY right after every task status
+# change commits (see record_task_transitions_bulk), instead of being
+# thrown away and rebuilt. Hashes expire after DASHBOARD_COUNTER_TTL so
+# drift (e.g. a rebuild racing the few microseconds between a commit and
+# its HINCRBY) is reconciled against the DB periodically;
+# `manage.py reconcile_dashboards` does it on demand.
+#
+# Money is stored in the smallest currency unit so it can use HINCRBY.
+
+BUSINESS_STATUS_BUCKETS = {
+    'open': 'open',
+    'claimed': 'claimed',
+    'completed': 'pending',
+    'approved': 'pending',
+    'paid': 'paid',
+}
+
+BUSINESS_AMOUNT_FIELDS = ('total_paid_amount',)
+WORKER_AMOUNT_FIELDS = ('total_earnings',)
+
+# Only touch a hash that already exists: a missing hash is rebuilt from
+# the DB on the next read, so incrementing it would store partial counts.
+INCREMENT_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for i = 1, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    return 1
+end
+return 0
+"""
+
+
+def business_dashboard_key(user_id):
+    return f"dashboard:business:{user_id}"
+
+
+def worker_dashboard_key(user_id):
+    return f"dashboard:worker:{user_id}"
+
+
+def to_minor_units(amount):
+    return int((Decimal(amount or 0) * 100).quantize(Decimal('1')))
+
+
+def paid_amount():
+    # Decimal even when nothing is paid yet, like the amounts read back
+    # from the hash (load_dashboard)
+    return Coalesce(
+        Sum("price", filter=Q(status='paid')),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
     )
 
-    data = {
-        "posted": Task.objects.filter(created_by=user).count(),
 
-        "open": Task.objects.filter(created_by=user ,
-                                       status__in=['open']
-                                       ).count(),
+def business_stats_aggregates():
+    return {
+        "posted": Count("id"),
+        "open": Count("id", filter=Q(status='open')),
+        "claimed": Count("id", filter=Q(status='claimed')),
+        "pending": Count("id", filter=Q(status__in=['completed', 'approved'])),
+        "paid": Count("id", filter=Q(status='paid')),
+        "total_paid_amount": paid_amount(),
+    }
 
-        "claimed": Task.objects.filter(created_by=user ,
-                                       status__in=['claimed']
-                                       ).count(),
 
-        "pending": Task.objects.filter(created_by=user ,
-                                       status__in=['completed', 'approved']
-                                       ).count(),
-        
-        "paid": Task.objects.filter(created_by=user ,
-                                       status__in=['paid']
-                                       ).count(),
+def worker_stats_aggregates():
+    return {
+        "claimed": Count("id"),
+        "completed": Count("id", filter=Q(status__in=['completed', 'approved', 'paid'])),
+        "total_earnings": paid_amount(),
+    }
 
-        "total_paid_amount": total_paid_amount,
+
+def merge_stats(*rows):
+    # Live + archived aggregates (archived tasks are all paid)
+    return {
+        field: sum(row[field] for row in rows)
+        for field in rows[0]
+    }
+
+
+def store_dashboard(key, data, amount_fields):
+    mapping = {
+        field: to_minor_units(value) if field in amount_fields else value
+        for field, value in data.items()
     }
-    cache.set(key, data, 300)
+
+    pipe = get_redis_connection("default").pipeline(transaction=True)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, settings.DASHBOARD_COUNTER_TTL)
+    pipe.execute()
+
+
+def load_dashboard(key, amount_fields):
+    raw = get_redis_connection("default").hgetall(key)
+    if not raw:
+        return None
+
+    data = {}
+    for field, value in raw.items():
+        field = field.decode()
+        if field in amount_fields:
+            data[field] = Decimal(int(value)).scaleb(-2)  # minor units -> 0.00
+        else:
+            data[field] = int(value)
+    return data
+
+
+def business_dashboard_stats(user_id):
+    key = business_dashboard_key(user_id)
+    data = load_dashboard(key, BUSINESS_AMOUNT_FIELDS)
+    record_cache("dashboard", data is not None)
+
+    if data is not None:
+        return data
+
+    data = merge_stats(*(
+        model.objects.filter(created_by_id=user_id).aggregate(**business_stats_aggregates())
+        for model in (Task, ArchivedTask)
+    ))
+    store_dashboard(key, data, BUSINESS_AMOUNT_FIELDS)
 
     return data
 
 
 def worker_dashboard_stats(user_id):
-    key = f"dashboard:worker:{user_id}"
-    data = cache.get(key)
+    key = worker_dashboard_key(user_id)
+    data = load_dashboard(key, WORKER_AMOUNT_FIELDS)
+    record_cache("dashboard", data is not None)
 
-    if data:
+    if data is not None:
         return data
-    
-    user = User.objects.get(id=user_id)
 
-    total_earnings = (
-        Task.objects
-        .filter(claimed_by=user, status="paid")
-        .aggregate(total=Sum("price"))["total"] or 0
-    )
-    
-    data = {
-        "claimed": Task.objects.filter(claimed_by=user).count(),
+    data = merge_stats(*(
+        model.objects.filter(claimed_by_id=user_id).aggregate(**worker_stats_aggregates())
+        for model in (Task, ArchivedTask)
+    ))
+    store_dashboard(key, data, WORKER_AMOUNT_FIELDS)
+
+    return data
+
+
+def business_counts(status, price):
+    # What a single task in `status` contributes to its creator's dashboard
+    if status is None:
+        return Counter()
+
+    counts = Counter({"posted": 1, BUSINESS_STATUS_BUCKETS[status]: 1})
+    if status == 'paid':
+        counts["total_paid_amount"] = to_minor_units(price)
+    return counts
+
+
+def worker_counts(status, price):
+    # What a single task in `status` contributes to its worker's dashboard
+    if status in (None, 'open'):
+        return Counter()
+
+    counts = Counter({"claimed": 1})
+    if status in ('completed', 'approved', 'paid'):
+        counts["completed"] = 1
+    if status == 'paid':
+        counts["total_earnings"] = to_minor_units(price)
+    return counts
+
+
+def counter_delta(counts_fn, from_status, to_status, price):
+    delta = Counter(counts_fn(to_status, price))
+    delta.subtract(counts_fn(from_status, price))
+    return {field: value for field, value in delta.items() if value}
+
 
-        "completed": Task.objects.filter(claimed_by=user ,
-                                        status__in=['completed', 'approved', 'paid']
-                                        ).count(),
+def apply_dashboard_deltas(deltas):
+    """
+    deltas: {redis key: {field: increment}}
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
 
-        "total_earnings": total_earnings,
+    redis = get_redis_connection("default")
+    increment = redis.register_script(INCREMENT_IF_EXISTS)
+
+    pipe = redis.pipeline(transaction=False)
+    for key, delta in deltas.items():
+        args = []
+        for field, value in delta.items():
+            args += [field, value]
+        increment(keys=[key], args=args, client=pipe)
+    pipe.execute()
+
+
+def dashboard_deltas(created_by_id, claimed_by_id, price, from_status, to_status):
+    """
+    Counter increments, keyed by dashboard hash, for one task moving from
+    `from_status` to `to_status` (None = created / deleted).
+    """
+    deltas = {
+        business_dashboard_key(created_by_id): counter_delta(
+            business_counts, from_status, to_status, price
+        ),
     }
-    cache.set(key, data, 300)
+    if claimed_by_id:
+        deltas[worker_dashboard_key(claimed_by_id)] = counter_delta(
+            worker_counts, from_status, to_status, price
+        )
+    return deltas
 
-    return data
+
+def reconcile_dashboard_counters():
+    """
+    Rebuild every dashboard hash from the DB, one grouped query per role
+    and table. Returns the number of dashboards written.
+    """
+    written = 0
+
+    for user_field, aggregates, key_fn, amount_fields in (
+        ("created_by_id", business_stats_aggregates, business_dashboard_key, BUSINESS_AMOUNT_FIELDS),
+        ("claimed_by_id", worker_stats_aggregates, worker_dashboard_key, WORKER_AMOUNT_FIELDS),
+    ):
+        rows = {}
+        for model in (Task, ArchivedTask):
+            grouped = (
+                model.objects
+                .filter(**{f"{user_field}__isnull": False})
+                .values(user_field)
+                .annotate(**aggregates())
+                .order_by()
+            )
+            for row in grouped:
+                user_id = row.pop(user_field)
+                rows[user_id] = merge_stats(row, rows[user_id]) if user_id in rows else merge_stats(row)
+
+        for user_id, row in rows.items():
+            store_dashboard(key_fn(user_id), row, amount_fields)
+            written += 1
+
+    return written
+
+
+# UNREAD NOTIFICATION COUNTER
+# Cached per user and adjusted in place when notifications are created or
+# read, so the unread-count endpoint is a single cache read. On a miss it
+# is rebuilt from the partial (recipient, is_read=False) index with
+# cache.add, so a slow rebuild never overwrites a count that another
+# request stored (and adjusted) meanwhile.
+
+def unread_count_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+# The validator of a user's notification list: bumped where notifications
+# are created, read or archived.
+def notification_version_key(user_id):
+    return f"notifications:version:{user_id}"
+
+
+def notification_version(user_id):
+    return cached_version(notification_version_key(user_id), settings.UNREAD_COUNT_TTL)
+
+
+async def anotification_version(user_id):
+    return await acached_version(notification_version_key(user_id), settings.UNREAD_COUNT_TTL)
+
+
+def bump_notification_version(user_id):
+    bump_versions(notification_version_key(user_id))
+
+
+def unread_notification_count(user_id):
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    record_cache("unread_count", count is not None)
+
+    if count is None:
+        count = Notification.objects.filter(
+            recipient_id=user_id,
+            is_read=False
+        ).count()
+        if not cache.add(key, count, settings.UNREAD_COUNT_TTL):
+            count = cache.get(key, count)
+
+    return max(count, 0)
+
+
+async def aunread_notification_count(user_id):
+    key = unread_count_key(user_id)
+    count = await cache.aget(key)
+    record_cache("unread_count", count is not None)
+
+    if count is None:
+        count = await Notification.objects.filter(
+            recipient_id=user_id,
+            is_read=False
+        ).acount()
+        if not await cache.aadd(key, count, settings.UNREAD_COUNT_TTL):
+            count = await cache.aget(key, count)
+
+    return max(count, 0)
+
+
+def adjust_unread_count(user_id, delta):
+    key = unread_count_key(user_id)
+
+    def apply():
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass  # Not cached: rebuilt from the DB on the next read
+
+    transaction.on_commit(apply)
+
+
+# REAL-TIME PUSH
+# Every new notification is pushed to the recipient's "user_<id>" group
+# (see consumers.NotificationConsumer) once the transaction commits.
+# Push is best effort: clients still have /notifications/ to catch up.
+
+def notification_message(notification):
+    return {
+        "type": "send_notification",
+        "data": {
+            "event": notification.type.upper(),
+            **NotificationSerializer(notification).data,
+        },
+    }
+
+
+async def group_send_all(channel_layer, messages):
+    for group, message in messages:
+        await channel_layer.group_send(group, message)
+
+
+def push_notifications(notifications):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    # One query per relation instead of one per notification
+    prefetch_related_objects(notifications, "actor", "task")
+
+    messages = [
+        (f"user_{notification.recipient_id}", notification_message(notification))
+        for notification in notifications
+    ]
+
+    try:
+        async_to_sync(group_send_all)(channel_layer, messages)
+    except Exception:
+        logger.exception("Failed to push %s notifications", len(messages))
+
+
+def push_notifications_on_commit(notifications):
+    notifications = list(notifications)
+    transaction.on_commit(lambda: push_notifications(notifications))
+
+
+def create_notifications_bulk(notifications):
+    """
+    Insert many notifications with one bulk_create, for fan-out events.
+
+    notifications: iterable of dicts of Notification fields (recipient,
+    task, type, message, actor), or their *_id forms.
+    """
+    objs = [Notification(**data) for data in notifications]
+    if not objs:
+        return []
+
+    created = Notification.objects.bulk_create(objs)
+
+    per_recipient = Counter(obj.recipient_id for obj in created)
+    for user_id, count in per_recipient.items():
+        adjust_unread_count(user_id, count)
+        bump_notification_version(user_id)
+
+    push_notifications_on_commit(created)
+
+    return created
+
+
+# PROOF IMAGE UPLOADS
+# Uploads never run inside the completion transaction. By default the images
+# are uploaded before the transaction opens. With SUPABASE_DEFERRED_UPLOADS
+# the processed images are saved as a PendingProofUpload in the completion
+# transaction, and the outbox dispatcher uploads and attaches them later, so
+# a restart or a Supabase outage only delays them: failed uploads stay
+# pending and are retried, with backoff, up to OUTBOX_MAX_ATTEMPTS times.
+#
+# Images are normalized and thumbnailed first (see core/images.py).
+
+
+def prepare_proof_images(upload):
+    """
+    Returns the normalized (image, thumbnail) for an uploaded proof.
+    Raises InvalidImage for anything Pillow can't read.
+    """
+    return process_proof_image(upload)
+
+
+def store_file(field_name, content):
+    field = TaskCompletion._meta.get_field(field_name)
+    name = field.generate_filename(None, content.name)
+    return field.storage.save(name, content)
+
+
+def store_proof_images(image, thumbnail):
+    """
+    Upload the proof and its thumbnail, returning their stored names.
+    """
+    image_name = store_file("proof_image", image)
+    try:
+        thumbnail_name = store_file("proof_thumbnail", thumbnail)
+    except Exception:
+        default_storage.delete(image_name)
+        raise
+
+    return image_name, thumbnail_name
+
+
+def delete_proof_images(*names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def defer_proof_image_upload(completion_id, image, thumbnail):
+    """
+    Must be called inside the transaction that creates the completion.
+    """
+    upload = PendingProofUpload.objects.create(
+        completion_id=completion_id,
+        image_name=image.name,
+        image=b"".join(image.chunks()),
+        thumbnail_name=thumbnail.name,
+        thumbnail=b"".join(thumbnail.chunks()),
+    )
+    OutboxEvent.objects.create(
+        topic="proof_upload",
+        payload={"upload_id": upload.id},
+    )
 
 
-def invalidate_dashboard_cache(task):
-    cache.delete(f"dashboard:business:{task.created_by_id}")
-    if task.claimed_by_id:
-        cache.delete(f"dashboard:worker:{task.claimed_by_id}")
+def upload_pending_proof_images(upload_ids):
+    """
+    Store the pending uploads and attach them to their completions. Runs
+    outside any transaction (see outbox.EXTERNAL_TOPICS): each upload is
+    stored first, then attached in a short transaction of its own. If that
+    fails, or a dispatcher whose lease ran out attached it meanwhile, the
+    images just stored are deleted again, so nothing is left orphaned.
+    """
+    for upload in PendingProofUpload.objects.filter(pk__in=upload_ids).select_related("completion"):
+        image_name, thumbnail_name = store_proof_images(
+            ContentFile(bytes(upload.image), name=upload.image_name),
+            ContentFile(bytes(upload.thumbnail), name=upload.thumbnail_name),
+        )
 
+        try:
+            with transaction.atomic():
+                attached, _ = PendingProofUpload.objects.filter(pk=upload.pk).delete()
+                if attached:
+                    TaskCompletion.objects.filter(pk=upload.completion_id).update(
+                        proof_image=image_name,
+                        proof_thumbnail=thumbnail_name,
+                    )
+                    bump_task_version(upload.completion.task_id)
+        except Exception:
+            delete_proof_images(image_name, thumbnail_name)
+            raise
 
-def create_notification(recipient, task, type, message, actor=None):
-    Notification.objects.create(
-        recipient=recipient,
-        task=task,
-        type=type,
-        message=message,
-        actor=actor
-    )
\ No newline at end of file
+        if not attached:
+            delete_proof_images(image_name, thumbnail_name)
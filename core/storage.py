@@ -1,10 +1,56 @@
 from django.core.files.storage import Storage
+from django.core.cache import cache
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 import requests
+import logging
 import mimetypes
 import posixpath
+import threading
+import time
+
+from .metrics import instrument_session, record_cache
+
+
+logger = logging.getLogger(__name__)
+
+# One pooled keep-alive session per process, shared by every storage
+# instance and thread, so repeated calls skip the TCP + TLS handshake.
+# requests.Session is safe to share across threads for plain requests;
+# the lock only guards its lazy creation.
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=1,  # a single Supabase host
+                    pool_maxsize=settings.SUPABASE_POOL_SIZE,
+                )
+                session = instrument_session(requests.Session(), 'supabase')
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+
+    return _session
+
+
+class StorageError(IOError):
+    """
+    Supabase did not store or delete an object (after any retries).
+    """
+
 
 class SupabaseStorage(Storage):
+    # Uploads are streamed in chunks of this size instead of being read
+    # into memory in one go.
+    chunk_size = 64 * 1024
+
     def __init__(self):
         self._base_url = settings.SUPABASE_URL  # ✅ FIXED: Rename to avoid conflict
         self.key = settings.SUPABASE_API_KEY
@@ -14,27 +60,97 @@ class SupabaseStorage(Storage):
             'apikey': self.key
         }
 
+        # (connect, read) timeouts so a slow Supabase can't hang a worker
+        self.timeout = (settings.SUPABASE_CONNECT_TIMEOUT, settings.SUPABASE_READ_TIMEOUT)
+        self.upload_retries = settings.SUPABASE_UPLOAD_RETRIES
+
+        self.session = get_session()
+
+    def _object_url(self, clean_name):
+        return f"{self._base_url}/storage/v1/object/{self.bucket}/{clean_name}"
+
+    # HEAD results (exists + size) are cached briefly in Redis, shared by all
+    # workers. get_available_name() calls exists() repeatedly while saving.
+    def _metadata_key(self, clean_name):
+        return f"storage:meta:{self.bucket}:{clean_name}"
+
+    def _metadata(self, name):
+        clean_name = name.replace('\\', '/')
+        key = self._metadata_key(clean_name)
+
+        metadata = cache.get(key)
+        record_cache('storage_metadata', metadata is not None)
+        if metadata is None:
+            r = self.session.head(self._object_url(clean_name), headers=self.headers, timeout=1)
+            metadata = {
+                'exists': r.status_code == 200,
+                'size': int(r.headers.get('Content-Length', 0)) if r.status_code == 200 else 0,
+            }
+            cache.set(key, metadata, settings.SUPABASE_METADATA_TTL)
+
+        return metadata
+
     def _save(self, name: str, content) -> str:
-        print(f"📤 UPLOADING {name}")
-        
+        logger.debug("Uploading %s", name)
+
         # ✅ FIX: Convert Windows \ → Unix / using posixpath
         clean_name = posixpath.join(*name.split('\\')).replace('\\', '/')
-        print(f"📤 CLEAN NAME: {clean_name}")
-        
-        file_bytes = content.read()
-        content_type, _ = mimetypes.guess_type(clean_name) or ('image/png',)
-        
-        upload_url = f"{self._base_url}/storage/v1/object/{self.bucket}/{clean_name}"
-        files = {'file': (clean_name, file_bytes, content_type)}
-        
-        response = requests.post(upload_url, headers=self.headers, files=files)
-        
-        if response.status_code in [200, 201]:
-            print(f"✅ UPLOADED {clean_name}")
+
+        content_type = mimetypes.guess_type(clean_name)[0] or 'image/png'
+        upload_url = self._object_url(clean_name)
+
+        response = None
+        for attempt in range(self.upload_retries + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))  # 0.5s, 1s, 2s...
+
+            # A timed-out attempt may still have stored the object,
+            # so retries overwrite instead of failing with a duplicate.
+            headers = {
+                **self.headers,
+                'Content-Type': content_type,
+                'x-upsert': 'true' if attempt else 'false',
+            }
+
+            try:
+                content.seek(0)
+                response = self.session.post(
+                    upload_url,
+                    data=content.chunks(self.chunk_size),  # chunked transfer encoding
+                    headers=headers,
+                    timeout=self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logger.warning("Upload attempt %s for %s failed: %s", attempt + 1, clean_name, e)
+                response = None
+                continue
+
+            if response.status_code < 500:
+                break
+
+        if response is not None and response.status_code in [200, 201]:
+            logger.info("Uploaded %s", clean_name)
+            cache.set(
+                self._metadata_key(clean_name),
+                {'exists': True, 'size': content.size},
+                settings.SUPABASE_METADATA_TTL,
+            )
             return clean_name  # Return clean name to database
-        else:
-            print(f"❌ Upload failed: {response.status_code} - {response.text}")
-            raise Exception(f"Upload failed: {response.text}")
+
+        if response is None:
+            raise StorageError(f"Upload failed: Supabase unreachable after {self.upload_retries + 1} attempts")
+
+        logger.error("Upload of %s failed: %s - %s", clean_name, response.status_code, response.text)
+        raise StorageError(f"Upload failed: {response.status_code} {response.text}")
+
+    def delete(self, name):
+        clean_name = name.replace('\\', '/')
+        response = self.session.delete(
+            self._object_url(clean_name), headers=self.headers, timeout=self.timeout
+        )
+        cache.delete(self._metadata_key(clean_name))
+        if response.status_code not in [200, 204, 404]:
+            raise StorageError(f"Delete failed: {response.status_code} {response.text}")
 
     def url(self, name: str) -> str:
         """✅ FIXED: Now callable - generates CDN URL"""
@@ -46,19 +162,13 @@ class SupabaseStorage(Storage):
         if not name:
             return False
         try:
-            clean_name = name.replace('\\', '/')
-            check_url = f"{self._base_url}/storage/v1/object/{self.bucket}/{clean_name}"
-            r = requests.head(check_url, headers=self.headers, timeout=1)
-            return r.status_code == 200
-        except:
+            return self._metadata(name)['exists']
+        except Exception:
             return False  # Fast fallback
 
     def size(self, name):
         """Optional: Return file size"""
         try:
-            clean_name = name.replace('\\', '/')
-            check_url = f"{self._base_url}/storage/v1/object/{self.bucket}/{clean_name}"
-            r = requests.head(check_url, headers=self.headers, timeout=1)
-            return int(r.headers.get('Content-Length', 0))
-        except:
+            return self._metadata(name)['size']
+        except Exception:
             return 0
@@ -1,3 +1,1290 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+import hashlib
+import hmac
+import json
+import pickle
+import re
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from django_redis import get_redis_connection
+from PIL import Image
+import stripe
+
+from microtasks.asgi import application
+
+from .benchmark import StubHandler, proof_png, run_concurrently
+from .management.commands.check_query_plans import is_sequential_scan
+from .models import *
+from .archive import archive_tasks
+from .authentication import auth_user_key, load_auth_user
+from .images import InvalidImage, process_proof_image
+from . import services
+from .outbox import dispatch_outbox, retry_delay
+from .recommendations import (
+    add_task_to_lists,
+    build_recommendations,
+    candidates_key,
+    default_profile,
+    history_profiles,
+)
+from .services import (
+    STRIPE_EVENT_HANDLERS,
+    business_dashboard_stats,
+    create_notifications_bulk,
+    handle_payment_intent_succeeded,
+    unread_count_key,
+    unread_notification_count,
+    worker_dashboard_stats,
+)
+from .storage import StorageError, SupabaseStorage
+from .views import NotificationListView, PayTaskView, claim_task
+
+
+# HELPERS
+# The API runs against the configured cache (Redis), which is flushed
+# before every test so counters and cached payloads never leak between them.
+
+def create_user(username, role):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="pw")
+    UserProfile.objects.create(user=user, role=role, phone="0000000000")
+    return user
+
+
+def create_task(created_by, status='open', claimed_by=None, **fields):
+    return Task.objects.create(
+        title=fields.pop('title', f"Task for {created_by.username}"),
+        description=fields.pop('description', "Something to do"),
+        price=fields.pop('price', 100),
+        created_by=created_by,
+        claimed_by=claimed_by,
+        status=status,
+        **fields,
+    )
+
+
+def auth_header(user):
+    return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # pooled keep-alive clients drop their connections at shutdown
+
+
+class StubServer:
+    """
+    Serves `handler` on a local port for the duration of a with block,
+    standing in for Stripe / Supabase.
+    """
+    def __init__(self, handler):
+        self.server = StubHTTPServer(("127.0.0.1", 0), handler)
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = create_user("business", "business")
+        self.worker = create_user("worker", "worker")
+
+    def get(self, url, user, **extra):
+        return self.client.get(url, **auth_header(user), **extra)
+
+    def assertQueryCountIndependentOfRows(self, fetch, add_rows):
+        """
+        fetch() must run the same number of queries after add_rows() as
+        before it: related objects are joined or prefetched, not loaded
+        one row at a time (N+1).
+        """
+        self.assertEqual(fetch().status_code, 200)  # warm up (auth cache)
+
+        with CaptureQueriesContext(connection) as before:
+            fetch()
+        add_rows()
+
+        with self.assertNumQueries(len(before)):
+            self.assertEqual(fetch().status_code, 200)
+
+
+
+# AUTHENTICATION CACHE
+class AuthUserCacheTests(APITestCase):
+    def test_cache_holds_no_password_hash(self):
+        self.assertEqual(self.get("/api/auth/profile/", self.business).status_code, 200)
+
+        entry = cache.get(auth_user_key(self.business.id))
+        self.assertIsNotNone(entry)
+        self.assertNotIn(self.business.password.encode(), pickle.dumps(entry))
+
+    def test_password_change_revokes_tokens(self):
+        # simplejwt's modules share one api_settings object (override_settings
+        # would rebind it in one module only)
+        with mock.patch.object(api_settings, "CHECK_REVOKE_TOKEN", True):
+            headers = auth_header(self.business)
+            self.assertEqual(self.client.get("/api/auth/profile/", **headers).status_code, 200)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.business.set_password("changed")
+                self.business.save()
+
+            self.assertEqual(self.client.get("/api/auth/profile/", **headers).status_code, 401)
+
+    def test_cached_user_keeps_the_role_and_defers_the_rest(self):
+        load_auth_user(self.business.id)
+
+        with self.assertNumQueries(0):
+            user = load_auth_user(self.business.id)
+            self.assertEqual((user.username, user.userprofile.role), ("business", "business"))
+        self.assertIn("password", user.get_deferred_fields())
+
+    def test_profile_endpoints_return_the_whole_profile(self):
+        UserProfile.objects.filter(user=self.business).update(city="Pune")
+        response = self.client.patch(
+            "/api/auth/profile/update/",
+            {"postal_code": "411001"},
+            content_type="application/json",
+            **auth_header(self.business),
+        )
+        self.assertEqual(response.status_code, 200)
+
+        data = self.get("/api/auth/profile/", self.business).json()
+        self.assertEqual((data["city"], data["postal_code"], data["phone"]), ("Pune", "411001", "0000000000"))
+        self.assertEqual(data["user"]["email"], "business@example.com")
+
+
+# REQUEST INSTRUMENTATION
+class RequestLoggingTests(APITestCase):
+    def test_only_slow_requests_are_logged_above_debug(self):
+        with self.settings(SLOW_REQUEST_MS=60_000), self.assertLogs("django.request", "DEBUG") as logs:
+            self.get("/api/auth/profile/", self.business)
+        self.assertEqual({record.levelname for record in logs.records}, {"DEBUG"})
+
+        with self.settings(SLOW_REQUEST_MS=0), self.assertLogs("django.request", "WARNING") as logs:
+            self.get("/api/auth/profile/", self.business)
+        self.assertIn("/api/auth/profile/ 200", logs.output[0])
+
+
+# TASK FEED PAGINATION
+class TaskFeedPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = [create_task(self.business) for _ in range(5)]
+
+    def test_feed_is_a_bare_list_by_default(self):
+        response = self.get("/api/tasks/?status=open", self.worker)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_pages_are_opt_in(self):
+        response = self.get("/api/tasks/?status=open&paginate=1&page_size=2", self.worker)
+        seen = [task["id"] for task in response.json()["results"]]
+
+        while response.json()["next"]:
+            response = self.get(response.json()["next"], self.worker)
+            seen += [task["id"] for task in response.json()["results"]]
+
+        self.assertEqual(seen, [task.id for task in reversed(self.tasks)])
+
+    def test_history_is_a_bare_list_by_default(self):
+        Task.objects.filter(pk=self.tasks[0].pk).update(status='paid', claimed_by=self.worker)
+
+        response = self.get("/api/tasks/?type=history", self.worker)
+
+        self.assertEqual([task["id"] for task in response.json()], [self.tasks[0].id])
+
+
+# TASK SEARCH
+class TaskSearchTests(APITestCase):
+    def search(self, **params):
+        response = self.client.get("/api/tasks/search/", params, **auth_header(self.worker))
+        self.assertEqual(response.status_code, 200)
+        return [task["title"] for task in response.json()["results"]]
+
+    def test_title_matches_rank_above_description_matches(self):
+        create_task(self.business, title="Paint the fence", description="Bring brushes")
+        create_task(self.business, title="Garden work", description="Fence repair and painting")
+        create_task(self.business, title="Clean windows", description="Second floor")
+
+        self.assertEqual(self.search(q="fence"), ["Paint the fence", "Garden work"])
+
+    def test_filters_apply_to_matches(self):
+        create_task(self.business, title="Cheap delivery", price=10)
+        create_task(self.business, title="Pricey delivery", price=500)
+        create_task(self.business, title="Closed delivery", price=10, status='approved')
+
+        self.assertEqual(self.search(q="delivery", max_price="50"), ["Cheap delivery"])
+
+    @skipUnless(connection.vendor == 'sqlite', "prefix matching is the SQLite FTS5 search-as-you-type")
+    def test_last_word_matches_as_a_prefix(self):
+        create_task(self.business, title="Grocery delivery")
+
+        self.assertEqual(self.search(q="groc"), ["Grocery delivery"])
+        self.assertEqual(self.search(q="grocery deliv"), ["Grocery delivery"])
+        self.assertEqual(self.search(q="groc delivery"), [])  # only the last word
+
+    def test_updated_text_is_reindexed(self):
+        task = create_task(self.business, title="Walk the dog")
+        task.title = "Feed the cat"
+        task.save()
+
+        self.assertEqual(self.search(q="dog"), [])
+        self.assertEqual(self.search(q="cat"), ["Feed the cat"])
+
+    def test_malformed_query_returns_an_empty_page(self):
+        create_task(self.business, title="Walk the dog")
+
+        for q in ['" OR ', 'NEAR(', '*', '-']:
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q=q), [])
+
+
+# TASK COMMENTS
+class TaskCommentTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = create_task(self.business, status='claimed', claimed_by=self.worker)
+        self.url = f"/api/tasks/{self.task.id}/comments/"
+
+    def post(self, user, message):
+        return self.client.post(self.url, {"message": message}, **auth_header(user))
+
+    def test_since_returns_only_newer_comments_in_order(self):
+        first = self.post(self.business, "First").json()
+        self.post(self.worker, "Second")
+        self.post(self.business, "Third")
+
+        response = self.get(f"{self.url}?since={first['id']}", self.worker)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["message"] for c in response.json()["results"]], ["Second", "Third"])
+
+    def test_non_integer_since_is_rejected(self):
+        response = self.get(f"{self.url}?since=latest", self.worker)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("since", response.json())
+
+    def test_only_participants_read_and_post(self):
+        outsider = create_user("outsider", "worker")
+        self.post(self.business, "Hello")
+
+        self.assertEqual(self.get(self.url, outsider).status_code, 403)
+        self.assertEqual(self.post(outsider, "Hi").status_code, 403)
+        self.assertEqual(TaskComment.objects.count(), 1)
+
+        # Not even a conditional GET with the thread's ETag gets through
+        etag = self.get(self.url, self.worker)["ETag"]
+        self.assertEqual(self.get(self.url, outsider, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+
+# QUERY COUNTS
+class QueryCountTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_worker = create_user("other_worker", "worker")
+
+    def claimed_task(self, worker):
+        return create_task(self.business, status='claimed', claimed_by=worker)
+
+    def test_task_list(self):
+        self.claimed_task(self.worker)
+
+        self.assertQueryCountIndependentOfRows(
+            lambda: self.get("/api/tasks/?type=claimed", self.business),
+            lambda: [self.claimed_task(worker) for worker in (self.worker, self.other_worker) * 5],
+        )
+
+    def test_task_list_page(self):
+        self.claimed_task(self.worker)
+
+        self.assertQueryCountIndependentOfRows(
+            lambda: self.get("/api/tasks/?type=claimed&paginate=1", self.business),
+            lambda: [self.claimed_task(worker) for worker in (self.worker, self.other_worker) * 5],
+        )
+
+    def test_task_detail(self):
+        # Every fetch misses the detail cache, so the DB side is measured
+        tasks = iter([self.completed_task(comments=1), self.completed_task(comments=10)])
+        task = next(tasks)
+
+        def fetch():
+            cache.clear()
+            return self.get(f"/api/tasks/{task.id}/", self.business)
+
+        def add_rows():
+            nonlocal task
+            task = next(tasks)
+
+        self.assertQueryCountIndependentOfRows(fetch, add_rows)
+
+    def completed_task(self, comments):
+        task = self.claimed_task(self.worker)
+        Task.objects.filter(pk=task.pk).update(status='completed')
+        TaskCompletion.objects.create(
+            task=task,
+            completed_by=self.worker,
+            proof_image="proofs/proof.webp",
+            proof_thumbnail="proofs/thumbs/proof.webp",
+            completion_details="Done",
+        )
+        self.add_comments(task, comments)
+        return task
+
+    def add_comments(self, task, count):
+        TaskComment.objects.bulk_create([
+            TaskComment(task=task, user=(self.business, self.worker)[i % 2], message=f"Message {i}")
+            for i in range(count)
+        ])
+
+    def test_comment_thread(self):
+        task = self.claimed_task(self.worker)
+        self.add_comments(task, 1)
+
+        self.assertQueryCountIndependentOfRows(
+            lambda: self.get(f"/api/tasks/{task.id}/comments/", self.worker),
+            lambda: self.add_comments(task, 10),
+        )
+
+    def test_notification_list(self):
+        def add_notifications(count):
+            task = self.claimed_task(self.worker)
+            Notification.objects.bulk_create([
+                Notification(
+                    recipient=self.business,
+                    actor=(self.worker, self.other_worker)[i % 2],
+                    task=task,
+                    type='task_claimed',
+                    message="Claimed",
+                )
+                for i in range(count)
+            ])
+
+        add_notifications(1)
+
+        self.assertQueryCountIndependentOfRows(
+            lambda: self.get("/api/notifications/", self.business),
+            lambda: add_notifications(10),
+        )
+
+
+
+
+# CONDITIONAL GETs
+class ConditionalListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.notification = Notification.objects.create(
+            recipient=self.business, type='task_claimed', message="Claimed"
+        )
+
+    def list_sync(self, **extra):
+        request = APIRequestFactory().get("/api/notifications/", **auth_header(self.business), **extra)
+        return NotificationListView.as_view()(request)
+
+    def list_async(self, **extra):
+        return self.get("/api/notifications/", self.business, **extra)
+
+    def test_unchanged_list_is_not_modified(self):
+        for fetch in (self.list_sync, self.list_async):
+            with self.subTest(fetch.__name__):
+                first = fetch()
+                self.assertNotIn("Last-Modified", first)
+
+                again = fetch(HTTP_IF_NONE_MATCH=first["ETag"])
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again["ETag"], first["ETag"])
+
+    def test_marking_read_changes_the_etag(self):
+        for fetch in (self.list_sync, self.list_async):
+            with self.subTest(fetch.__name__):
+                unread = Notification.objects.create(
+                    recipient=self.business, type='task_claimed', message="Claimed"
+                )
+                etag = fetch()["ETag"]
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.patch(f"/api/notifications/{unread.id}/read/", **auth_header(self.business))
+
+                response = fetch(HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_not_modified_skips_the_list_query(self):
+        etag = self.list_sync()["ETag"]
+
+        # only the (cached) authentication lookup, no list or count query
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.list_sync(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse(any("core_notification" in q["sql"] for q in queries))
+
+    def test_pages_have_their_own_etag(self):
+        for i in range(3):
+            create_task(self.business, title=f"Task {i}")
+
+        first = self.get("/api/tasks/?status=open&page_size=2&paginate=1", self.business)
+        second = self.get(first.json()["next"], self.business)
+
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        again = self.get(first.json()["next"], self.business, HTTP_IF_NONE_MATCH=second["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+
+# NOTIFICATIONS
+class NotificationTests(APITestCase):
+    def unread_count(self, user):
+        return self.get("/api/notifications/unread-count/", user).json()["unread_count"]
+
+    def notify(self, *recipients):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notifications_bulk([
+                {"recipient": recipient, "type": 'task_claimed', "message": "Claimed"}
+                for recipient in recipients
+            ])
+
+    def patch(self, url, user, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(url, data, content_type="application/json", **auth_header(user))
+
+    def test_unread_counter_follows_create_and_read(self):
+        self.assertEqual(self.unread_count(self.business), 0)  # cached from here on
+
+        first, second, _ = self.notify(self.business, self.business, self.business)
+        self.assertEqual(self.unread_count(self.business), 3)
+
+        self.patch(f"/api/notifications/{first.id}/read/", self.business)
+        self.assertEqual(self.unread_count(self.business), 2)
+
+        self.patch(f"/api/notifications/{first.id}/read/", self.business)  # already read
+        self.assertEqual(self.unread_count(self.business), 2)
+
+        self.patch("/api/notifications/read/", self.business, {"ids": [second.id]})
+        self.assertEqual(self.unread_count(self.business), 1)
+
+        self.patch("/api/notifications/read-all/", self.business)
+        self.assertEqual(self.unread_count(self.business), 0)
+
+    def test_batch_read_ignores_ids_of_other_users(self):
+        mine, also_mine, theirs = self.notify(self.business, self.business, self.worker)
+
+        response = self.patch("/api/notifications/read/", self.business, {"ids": [mine.id, theirs.id]})
+        self.assertEqual(response.json(), {"updated": 1})
+
+        again = self.patch("/api/notifications/read/", self.business, {"ids": [mine.id, also_mine.id]})
+        self.assertEqual(again.json(), {"updated": 1})
+
+        self.assertFalse(Notification.objects.get(pk=theirs.pk).is_read)
+        self.assertEqual(self.unread_count(self.worker), 1)
+
+    def test_read_all_marks_only_own_notifications(self):
+        self.notify(self.business, self.business, self.worker)
+
+        self.assertEqual(self.patch("/api/notifications/read-all/", self.business).json(), {"updated": 2})
+        self.assertEqual(self.patch("/api/notifications/read-all/", self.business).json(), {"updated": 0})
+        self.assertEqual(self.unread_count(self.business), 0)
+        self.assertEqual(self.unread_count(self.worker), 1)
+
+    def test_bulk_create_counts_after_commit(self):
+        self.assertEqual(self.unread_count(self.worker), 0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            created = create_notifications_bulk([
+                {"recipient_id": self.worker.id, "type": 'task_claimed', "message": "Claimed"},
+                {"recipient_id": self.worker.id, "type": 'task_approved', "message": "Approved"},
+                {"recipient_id": self.business.id, "type": 'task_claimed', "message": "Claimed"},
+            ])
+            self.assertEqual(len(created), 3)
+            self.assertEqual(self.unread_count(self.worker), 0)  # not committed yet
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.unread_count(self.worker), 2)
+        self.assertEqual(self.unread_count(self.business), 1)
+
+    def test_rebuild_keeps_a_count_stored_meanwhile(self):
+        self.notify(self.business)
+        key = unread_count_key(self.business.id)
+        add = cache.add
+
+        def add_after_concurrent_write(*args, **kwargs):
+            cache.set(key, 2)  # rebuilt and adjusted by another request meanwhile
+            return add(*args, **kwargs)
+
+        with mock.patch.object(cache, "add", add_after_concurrent_write):
+            self.assertEqual(unread_notification_count(self.business.id), 2)
+        self.assertEqual(cache.get(key), 2)
+
+
+# channels' database_sync_to_async closes the connection around every call,
+# which would end a TestCase's wrapping transaction (PostgreSQL)
+class NotificationSocketTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.worker = create_user("worker", "worker")
+
+    async def connect(self, query):
+        communicator = WebsocketCommunicator(application, f"/ws/notifications/?{query}")
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_bad_token_is_rejected(self):
+        for query in ("token=not-a-jwt", ""):
+            with self.subTest(query=query):
+                communicator, connected = await self.connect(query)
+                self.assertFalse(connected)
+                await communicator.disconnect()
+
+    async def test_new_notification_is_pushed_after_commit(self):
+        token = RefreshToken.for_user(self.worker).access_token
+        communicator, connected = await self.connect(f"token={token}")
+        self.assertTrue(connected)
+
+        def notify():
+            with transaction.atomic():
+                notification, = create_notifications_bulk([
+                    {"recipient": self.worker, "type": 'task_approved', "message": "Approved"},
+                ])
+                self.assertTrue(async_to_sync(communicator.receive_nothing)(0.2))  # not before commit
+            return notification
+
+        notification = await sync_to_async(notify)()
+        message = await communicator.receive_json_from(timeout=5)
+
+        self.assertEqual(message["event"], "TASK_APPROVED")
+        self.assertEqual(message["id"], notification.id)
+        await communicator.disconnect()
+
+
+# QUERY PLANS
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertNotIn("✗", out.getvalue())
+
+    def test_unindexed_filter_is_reported(self):
+        plan = Task.objects.filter(title="logo").explain()
+        self.assertTrue(is_sequential_scan(plan))
+
+
+
+# CLAIM RACES
+# Every claim runs in its own thread and connection against committed rows,
+# so this needs a database with real row locking (not SQLite).
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentClaimTests(TransactionTestCase):
+    CLAIMS = 200
+    THREADS = 50  # stays under the server's max_connections
+
+    def setUp(self):
+        cache.clear()
+        self.business = create_user("business", "business")
+        self.workers = User.objects.bulk_create(
+            User(username=f"worker{i}") for i in range(self.CLAIMS)
+        )
+        UserProfile.objects.bulk_create(
+            UserProfile(user=worker, role='worker', phone="0000000000") for worker in self.workers
+        )
+
+    def race(self, task):
+        start = threading.Event()
+
+        def claim(worker):
+            start.wait()
+            try:
+                return claim_task(task.pk, worker)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            futures = [pool.submit(claim, worker) for worker in self.workers]
+            start.set()
+            return [future.result() for future in futures]
+
+    def test_exactly_one_claim_wins(self):
+        for strategy in ('update', 'skip_locked', 'nowait'):
+            with self.subTest(strategy=strategy), override_settings(TASK_CLAIM_STRATEGY=strategy):
+                task = create_task(self.business)
+
+                winners = [claimed for claimed in self.race(task) if claimed is not None]
+
+                self.assertEqual(len(winners), 1)
+                task.refresh_from_db()
+                self.assertEqual(task.status, 'claimed')
+                self.assertEqual(task.claimed_by_id, winners[0].claimed_by.id)
+
+
+
+# BENCHMARK RUNNER
+class BenchmarkRunnerTests(TestCase):
+    def test_exceptions_unexpected_statuses_and_timeouts_are_errors(self):
+        stuck = threading.Event()
+
+        def make_request(client, i):
+            if i == 0:
+                raise RuntimeError("boom")
+            if i == 1:
+                stuck.wait(5)  # never finishes within the timeout
+            return client.get("/api/health/" if i % 2 else "/api/missing/")
+
+        result = run_concurrently(make_request, total=6, concurrency=2, timeout=1)
+        stuck.set()
+
+        self.assertEqual((result["attempted"], result["completed"], result["lost"]), (6, 5, 1))
+        # The exception, the stuck request and two 404s
+        self.assertEqual(result["errors"], 4)
+        self.assertEqual(result["status_codes"], {"200": 2, "404": 2, "exception": 1})
+
+
+# DASHBOARDS
+class DashboardTests(APITestCase):
+    def test_amounts_are_decimal_when_built_and_when_cached(self):
+        for stats, field, user in (
+            (business_dashboard_stats, "total_paid_amount", self.business),
+            (worker_dashboard_stats, "total_earnings", self.worker),
+        ):
+            built, cached = stats(user.id), stats(user.id)
+
+            self.assertEqual(built, cached)
+            self.assertEqual(built[field], Decimal("0.00"))
+            self.assertIsInstance(built[field], Decimal)
+            self.assertIsInstance(cached[field], Decimal)
+
+    def test_paid_amount_round_trips_through_the_cache(self):
+        create_task(self.business, status='paid', claimed_by=self.worker, price=Decimal("12.50"))
+
+        built, cached = business_dashboard_stats(self.business.id), business_dashboard_stats(self.business.id)
+
+        self.assertEqual(built["total_paid_amount"], Decimal("12.50"))
+        self.assertEqual(cached["total_paid_amount"], Decimal("12.50"))
+
+    def create_task_via_api(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/tasks/",
+                {"title": "Logo", "description": "Design a logo", "price": "10.00"},
+                content_type="application/json",
+                **auth_header(self.business),
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_transition_after_a_rebuild_is_counted_once(self):
+        self.create_task_via_api()
+
+        self.assertEqual(business_dashboard_stats(self.business.id)["posted"], 1)
+        dispatch_outbox()
+
+        stats = business_dashboard_stats(self.business.id)
+        self.assertEqual((stats["posted"], stats["open"]), (1, 1))
+
+    def test_transition_updates_a_cached_dashboard(self):
+        business_dashboard_stats(self.business.id)
+
+        self.create_task_via_api()
+        dispatch_outbox()
+
+        stats = business_dashboard_stats(self.business.id)
+        self.assertEqual((stats["posted"], stats["open"]), (1, 1))
+
+
+
+# RECOMMENDATIONS
+class RecommendationProfileTests(APITestCase):
+    def test_archiving_keeps_the_worker_history(self):
+        other_business = create_user("other", "business")
+        create_task(self.business, status='paid', claimed_by=self.worker, price=40, duration_minutes=30)
+        create_task(self.business, status='claimed', claimed_by=self.worker, price=10)
+        create_task(other_business, status='paid', claimed_by=self.worker, price=25, duration_minutes=60)
+        create_task(other_business, price=5)
+
+        before = (history_profiles([self.worker.id]), default_profile())
+        cache.clear()
+        archive_tasks(timezone.now() + timedelta(days=1))
+
+        self.assertEqual(ArchivedTask.objects.count(), 2)
+        self.assertEqual((history_profiles([self.worker.id]), default_profile()), before)
+        self.assertEqual(before[0][self.worker.id]["claimed"], 3)
+
+
+class RecommendedTasksTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_business = create_user("other", "business")
+        # History: tasks around 50 for 30 minutes, all for self.business
+        for price in (40, 50, 60):
+            create_task(self.business, status='paid', claimed_by=self.worker, price=price, duration_minutes=30)
+
+        self.familiar = create_task(self.business, price=50, duration_minutes=30)
+        self.similar = create_task(self.other_business, price=50, duration_minutes=30)
+        self.unlike = create_task(self.other_business, price=900, duration_minutes=480)
+        create_task(self.business, status='claimed', claimed_by=create_user("rival", "worker"), price=50)
+        create_task(self.worker, price=50, duration_minutes=30)  # their own task
+
+    def recommended(self):
+        response = self.get("/api/tasks/recommended/", self.worker)
+        self.assertEqual(response.status_code, 200)
+        return [task["id"] for task in response.json()]
+
+    def test_list_follows_the_worker_history(self):
+        self.assertEqual(build_recommendations([self.worker.id]), 1)
+
+        self.assertEqual(self.recommended(), [self.familiar.id, self.similar.id, self.unlike.id])
+
+    def test_list_is_built_on_first_read(self):
+        self.assertEqual(self.recommended(), [self.familiar.id, self.similar.id, self.unlike.id])
+
+    def test_new_task_is_scored_into_existing_lists(self):
+        build_recommendations([self.worker.id])
+        task = create_task(self.business, price=45, duration_minutes=30)
+
+        add_task_to_lists({
+            "id": task.id, "price": task.price,
+            "duration_minutes": task.duration_minutes, "created_by_id": self.business.id,
+        })
+
+        self.assertEqual(self.recommended()[:3], [self.familiar.id, task.id, self.similar.id])
+
+    def test_tasks_no_longer_open_are_dropped(self):
+        build_recommendations([self.worker.id])
+        Task.objects.filter(pk=self.familiar.pk).update(status='claimed', claimed_by=self.worker)
+
+        self.assertEqual(self.recommended(), [self.similar.id, self.unlike.id])
+        members = get_redis_connection("default").zrange(candidates_key(self.worker.id), 0, -1)
+        self.assertNotIn(str(self.familiar.id).encode(), members)
+
+    def test_only_workers_get_recommendations(self):
+        self.assertEqual(self.get("/api/tasks/recommended/", self.business).status_code, 403)
+
+
+# PROOF UPLOADS
+@override_settings(PROOF_IMAGE_FORMAT='WEBP', PROOF_IMAGE_MAX_DIMENSION=400, PROOF_THUMBNAIL_SIZE=100)
+class ProofImageTests(TestCase):
+    def phone_photo(self):
+        exif = Image.Exif()
+        exif[0x010F] = "PhoneMaker"  # Make
+        exif[0x0132] = "2026:01:01 12:00:00"  # DateTime
+        buffer = BytesIO()
+        Image.new("RGB", (1200, 600), (200, 120, 80)).save(buffer, format="JPEG", exif=exif)
+        return SimpleUploadedFile("photo.jpeg", buffer.getvalue(), content_type="image/jpeg")
+
+    def open(self, content_file):
+        content_file.seek(0)
+        img = Image.open(content_file)
+        img.load()
+        return img
+
+    def test_proof_is_reencoded_resized_and_stripped(self):
+        photo = self.phone_photo()
+        self.assertEqual(self.open(photo).getexif()[0x010F], "PhoneMaker")
+
+        image, thumbnail = process_proof_image(photo)
+
+        self.assertEqual(image.name, "photo.webp")
+        self.assertEqual(thumbnail.name, "photo_thumb.webp")
+
+        img = self.open(image)
+        self.assertEqual(img.format, "WEBP")
+        self.assertEqual(img.size, (400, 200))
+        self.assertEqual(len(img.getexif()), 0)
+
+        thumb = self.open(thumbnail)
+        self.assertEqual(thumb.format, "WEBP")
+        self.assertEqual(thumb.size, (100, 50))
+        self.assertEqual(len(thumb.getexif()), 0)
+
+    def test_unreadable_upload_is_rejected(self):
+        with self.assertRaises(InvalidImage):
+            process_proof_image(SimpleUploadedFile("photo.jpeg", b"not an image"))
+
+
+class SupabaseStub(StubHandler):
+    uploads = {}  # path -> (body, Transfer-Encoding, x-upsert)
+    failures = 0  # the next N uploads answer 503
+    heads = 0
+
+    def do_POST(self):
+        body = self.read_body()
+        if SupabaseStub.failures:
+            SupabaseStub.failures -= 1
+            return self.reply(503, {"error": "unavailable"})
+
+        SupabaseStub.uploads[self.path] = (
+            body, self.headers.get("Transfer-Encoding"), self.headers.get("x-upsert"),
+        )
+        self.reply(200, {"Key": self.path})
+
+    def do_HEAD(self):
+        SupabaseStub.heads += 1
+        if self.path not in SupabaseStub.uploads:
+            return self.reply(404)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(SupabaseStub.uploads[self.path][0])))
+        self.end_headers()
+
+    def do_DELETE(self):
+        SupabaseStub.uploads.pop(self.path, None)
+        self.reply(200)
+
+
+class SupabaseStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SupabaseStub.uploads, SupabaseStub.failures, SupabaseStub.heads = {}, 0, 0
+        self.stub = StubServer(SupabaseStub).__enter__()
+        self.addCleanup(self.stub.__exit__)
+
+        self.storage = SupabaseStorage()
+        self.storage._base_url = self.stub.url
+        self.storage.chunk_size = 1024
+
+    def test_upload_is_streamed_in_chunks(self):
+        content = bytes(range(256)) * 20
+
+        name = self.storage.save("proofs/proof.webp", ContentFile(content, name="proof.webp"))
+
+        body, encoding, upsert = SupabaseStub.uploads[f"/storage/v1/object/{self.storage.bucket}/{name}"]
+        self.assertEqual(body, content)
+        self.assertEqual(encoding, "chunked")
+        self.assertEqual(upsert, "false")
+
+    def test_failed_attempts_are_retried_as_upserts(self):
+        SupabaseStub.failures = 1
+        self.storage.upload_retries = 1
+
+        name = self.storage.save("proofs/proof.webp", ContentFile(b"image", name="proof.webp"))
+
+        _, _, upsert = SupabaseStub.uploads[f"/storage/v1/object/{self.storage.bucket}/{name}"]
+        self.assertEqual(upsert, "true")
+
+    def test_gives_up_after_the_last_retry(self):
+        SupabaseStub.failures = 2
+        self.storage.upload_retries = 1
+
+        with self.assertRaises(StorageError):
+            self.storage.save("proofs/proof.webp", ContentFile(b"image", name="proof.webp"))
+        self.assertEqual(SupabaseStub.uploads, {})
+
+    def test_head_result_is_cached_until_a_save_or_delete(self):
+        name = "proofs/proof.webp"
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(SupabaseStub.heads, 1)
+
+        self.storage.save(name, ContentFile(b"image", name="proof.webp"))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 5)
+        self.assertEqual(SupabaseStub.heads, 1)
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(SupabaseStub.heads, 2)
+
+
+class StubStorageTestCase(APITestCase):
+    """
+    The default storage talks to SupabaseStub for the duration of a test.
+    """
+    def setUp(self):
+        super().setUp()
+        SupabaseStub.uploads, SupabaseStub.failures = {}, 0
+        stub = StubServer(SupabaseStub).__enter__()
+        self.addCleanup(stub.__exit__)
+
+        saved = default_storage._base_url, default_storage.upload_retries
+        default_storage._base_url, default_storage.upload_retries = stub.url, 0
+        self.addCleanup(setattr, default_storage, "_base_url", saved[0])
+        self.addCleanup(setattr, default_storage, "upload_retries", saved[1])
+
+    def complete_task(self, task, image=None):
+        return self.client.patch(
+            f"/api/tasks/{task.id}/complete/",
+            data=encode_multipart(BOUNDARY, {
+                "completion_details": "Done",
+                "proof_image": SimpleUploadedFile("proof.png", image or proof_png(), "image/png"),
+            }),
+            content_type=MULTIPART_CONTENT,
+            **auth_header(task.claimed_by),
+        )
+
+
+@override_settings(SUPABASE_DEFERRED_UPLOADS=False)
+class ProofUploadTests(StubStorageTestCase):
+    def test_failed_upload_leaves_the_task_claimed(self):
+        task = create_task(self.business, status='claimed', claimed_by=self.worker)
+        SupabaseStub.failures = 1
+
+        response = self.complete_task(task)
+
+        self.assertEqual(response.status_code, 503)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'claimed')
+        self.assertFalse(TaskCompletion.objects.exists())
+
+
+@override_settings(SUPABASE_DEFERRED_UPLOADS=True)
+class DeferredProofUploadTests(StubStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = create_task(self.business, status='claimed', claimed_by=self.worker)
+
+    def test_completion_commits_before_the_upload(self):
+        self.assertEqual(self.complete_task(self.task).status_code, 200)
+
+        completion = TaskCompletion.objects.get(task=self.task)
+        self.assertEqual(completion.proof_image.name, '')
+        self.assertTrue(PendingProofUpload.objects.filter(completion=completion).exists())
+        self.assertEqual(SupabaseStub.uploads, {})
+
+    def test_dispatcher_retries_failed_uploads(self):
+        self.complete_task(self.task)
+        completion = TaskCompletion.objects.get(task=self.task)
+
+        SupabaseStub.failures = 2  # the batch attempt and the one-by-one retry
+        dispatch_outbox()
+
+        event = OutboxEvent.objects.get(topic='proof_upload')
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        completion.refresh_from_db()
+        self.assertEqual(completion.proof_image.name, '')
+
+        # Backing off: not claimed again until next_attempt_at
+        self.assertEqual(dispatch_outbox(), 0)
+        OutboxEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+        dispatch_outbox()
+
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+        completion.refresh_from_db()
+        self.assertTrue(completion.proof_image.name.startswith('proofs/'))
+        self.assertTrue(completion.proof_thumbnail.name.startswith('proofs/thumbs/'))
+        self.assertFalse(PendingProofUpload.objects.exists())
+        self.assertEqual(len(SupabaseStub.uploads), 2)
+
+    def test_upload_runs_after_the_claim_commits(self):
+        self.complete_task(self.task)
+        store_file = services.store_file
+
+        def store_outside_transaction(*args):
+            # Only the test's own wrapping transactions may be open
+            self.assertTrue(all(getattr(block, "_from_testcase", False) for block in connection.atomic_blocks))
+            event = OutboxEvent.objects.get(topic='proof_upload')
+            self.assertGreater(event.next_attempt_at, timezone.now())  # leased
+            return store_file(*args)
+
+        # A failed check fails the handler, leaving the event unprocessed
+        with mock.patch.object(services, "store_file", store_outside_transaction):
+            dispatch_outbox()
+
+        self.assertIsNotNone(OutboxEvent.objects.get(topic='proof_upload').processed_at)
+        self.assertEqual(len(SupabaseStub.uploads), 2)
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        with self.settings(OUTBOX_RETRY_DELAY=30, OUTBOX_MAX_RETRY_DELAY=100):
+            self.assertEqual(
+                [retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)],
+                [30, 60, 100, 100],
+            )
+
+
+# TASK DETAIL CACHE
+class TaskDetailCacheTests(StubStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = create_task(self.business)
+
+    def detail(self, **extra):
+        return self.get(f"/api/tasks/{self.task.id}/", self.business, **extra)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.detail()["ETag"]
+
+        response = self.detail(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_every_change_moves_the_etag(self):
+        def claim():
+            return self.client.patch(f"/api/tasks/{self.task.id}/claim/", **auth_header(self.worker))
+
+        def comment():
+            return self.client.post(
+                f"/api/tasks/{self.task.id}/comments/", {"message": "On it"}, **auth_header(self.business)
+            )
+
+        def complete():
+            self.task.refresh_from_db()
+            return self.complete_task(self.task)
+
+        def approve():
+            return self.client.patch(f"/api/tasks/{self.task.id}/approve/", **auth_header(self.business))
+
+        for change in (claim, comment, complete, approve):
+            with self.subTest(change.__name__):
+                before = self.detail()
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.assertLess(change().status_code, 300)
+
+                after = self.detail(HTTP_IF_NONE_MATCH=before["ETag"])
+                self.assertEqual(after.status_code, 200)
+                self.assertNotEqual(after["ETag"], before["ETag"])
+                self.assertNotEqual(after.json(), before.json())
+
+
+# STRIPE PAYMENTS
+class FakeStripe(StubHandler):
+    """
+    Keeps the intents it creates, honours Idempotency-Key like Stripe does
+    and lets tests move intents between states.
+    """
+    intents = {}
+    idempotency_keys = {}
+
+    def do_POST(self):
+        params = parse_qs(self.read_body().decode())
+
+        match = re.match(r"^/v1/payment_intents/([^/?]+)/cancel", self.path)
+        if match:
+            intent = FakeStripe.intents[match.group(1)]
+            if intent["status"] in ("processing", "succeeded"):
+                return self.reply(400, {"error": {
+                    "type": "invalid_request_error",
+                    "message": f"This PaymentIntent's status is {intent['status']}.",
+                }})
+            intent["status"] = "canceled"
+            return self.reply(200, intent)
+
+        if self.path.startswith("/v1/payment_intents"):
+            key = self.headers.get("Idempotency-Key")
+            if key not in FakeStripe.idempotency_keys:
+                intent = self.intent(f"pi_{len(FakeStripe.intents) + 1}")
+                intent["amount"] = int(params["amount"][0])
+                FakeStripe.intents[intent["id"]] = intent
+                FakeStripe.idempotency_keys[key] = intent["id"]
+            return self.reply(200, FakeStripe.intents[FakeStripe.idempotency_keys[key]])
+
+        self.reply(404)
+
+    def do_GET(self):
+        match = re.match(r"^/v1/payment_intents/([^/?]+)", self.path)
+        if match and match.group(1) in FakeStripe.intents:
+            return self.reply(200, FakeStripe.intents[match.group(1)])
+        self.reply(404, {"error": {"message": "No such payment_intent"}})
+
+    @classmethod
+    def set_status(cls, intent_id, status):
+        cls.intents[intent_id]["status"] = status
+
+
+class StripeTestCase(APITestCase):
+    def setUp(self):
+        super().setUp()
+        FakeStripe.intents, FakeStripe.idempotency_keys = {}, {}
+        stub = StubServer(FakeStripe).__enter__()
+        self.addCleanup(stub.__exit__)
+
+        saved = stripe.api_base
+        stripe.api_base = stub.url
+        self.addCleanup(setattr, stripe, "api_base", saved)
+
+    def approved_task(self, price=100):
+        return create_task(self.business, status='approved', claimed_by=self.worker, price=price)
+
+
+class PayTaskTests(StripeTestCase):
+    def pay_sync(self, task):
+        request = APIRequestFactory().patch(f"/api/tasks/{task.id}/pay/", **auth_header(self.business))
+        return PayTaskView.as_view()(request, pk=task.id)
+
+    def pay_async(self, task):
+        return self.client.patch(f"/api/tasks/{task.id}/pay/async/", **auth_header(self.business))
+
+    def pay_both_ways(self):
+        for pay in (self.pay_sync, self.pay_async):
+            with self.subTest(pay.__name__):
+                FakeStripe.intents.clear()
+                FakeStripe.idempotency_keys.clear()
+                Payment.objects.all().delete()
+                yield pay, self.approved_task()
+
+    def test_paying_twice_reuses_the_intent(self):
+        for pay, task in self.pay_both_ways():
+            first, second = pay(task), pay(task)
+
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first.data["client_secret"], second.data["client_secret"])
+            self.assertEqual(len(FakeStripe.intents), 1)
+            self.assertEqual(task.payments.count(), 1)
+
+    def test_processing_or_succeeded_intent_is_not_charged_again(self):
+        for status in ("processing", "succeeded"):
+            for pay, task in self.pay_both_ways():
+                pay(task)
+                FakeStripe.set_status("pi_1", status)
+
+                response = pay(task)
+
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(list(FakeStripe.intents), ["pi_1"])
+                self.assertEqual(list(task.payments.values_list("status", flat=True)), ["pending"])
+
+    def test_canceled_intent_is_replaced(self):
+        for pay, task in self.pay_both_ways():
+            pay(task)
+            FakeStripe.set_status("pi_1", "canceled")
+
+            response = pay(task)
+
+            self.assertEqual(response.data["client_secret"], FakeStripe.intents["pi_2"]["client_secret"])
+            self.assertEqual(
+                dict(task.payments.values_list("stripe_payment_intent_id", "status")),
+                {"pi_1": "failed", "pi_2": "pending"},
+            )
+
+
+class BulkPayTests(StripeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a, self.b, self.c = (self.approved_task(price) for price in (10, 20, 30))
+
+    def bulk_pay(self, *tasks):
+        return self.client.patch(
+            "/api/tasks/bulk/pay/",
+            {"ids": [task.id for task in tasks]},
+            content_type="application/json",
+            **auth_header(self.business),
+        )
+
+    def pay(self, task):
+        return self.client.patch(f"/api/tasks/{task.id}/pay/", **auth_header(self.business))
+
+    def payments(self):
+        return set(Payment.objects.values_list("task_id", "stripe_payment_intent_id", "status"))
+
+    def test_retrying_the_same_batch_returns_its_intent(self):
+        first = self.bulk_pay(self.a, self.b)
+        second = self.bulk_pay(self.b, self.a)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()["client_secret"], second.json()["client_secret"])
+        self.assertEqual(list(FakeStripe.intents), ["pi_1"])
+        self.assertEqual(FakeStripe.intents["pi_1"]["amount"], 3000)
+
+    def test_overlapping_batch_supersedes_the_stale_intent(self):
+        self.bulk_pay(self.a, self.b)
+
+        response = self.bulk_pay(self.b, self.c)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["client_secret"], FakeStripe.intents["pi_2"]["client_secret"])
+        self.assertEqual(FakeStripe.intents["pi_1"]["status"], "canceled")
+        self.assertEqual(self.payments(), {
+            (self.a.id, "pi_1", "failed"),
+            (self.b.id, "pi_1", "failed"),
+            (self.b.id, "pi_2", "pending"),
+            (self.c.id, "pi_2", "pending"),
+        })
+
+        # The task left out of the new batch can still be paid
+        self.assertEqual(self.pay(self.a).status_code, 200)
+        self.assertEqual(FakeStripe.intents["pi_3"]["amount"], 1000)
+
+    def test_paying_a_task_alone_supersedes_its_batch(self):
+        self.bulk_pay(self.a, self.b)
+
+        response = self.pay(self.a)
+
+        self.assertEqual(response.json()["client_secret"], FakeStripe.intents["pi_2"]["client_secret"])
+        self.assertEqual(FakeStripe.intents["pi_2"]["amount"], 1000)
+        self.assertEqual(FakeStripe.intents["pi_1"]["status"], "canceled")
+
+    def test_batch_being_charged_is_not_superseded(self):
+        self.bulk_pay(self.a, self.b)
+        FakeStripe.set_status("pi_1", "processing")
+
+        self.assertEqual(self.bulk_pay(self.a, self.b).status_code, 409)
+        self.assertEqual(self.bulk_pay(self.b, self.c).status_code, 409)
+        self.assertEqual(self.pay(self.a).status_code, 409)
+        self.assertEqual(list(FakeStripe.intents), ["pi_1"])
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test", STRIPE_WEBHOOK_DEFERRED=False)
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = create_task(self.business, status='approved', claimed_by=self.worker)
+        Payment.objects.create(task=self.task, stripe_payment_intent_id="pi_1", amount=100)
+        self.handler = mock.Mock(wraps=handle_payment_intent_succeeded)
+        patcher = mock.patch.dict(STRIPE_EVENT_HANDLERS, {"payment_intent.succeeded": self.handler})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deliver(self, event_id="evt_1"):
+        payload = json.dumps({
+            "id": event_id,
+            "object": "event",
+            "type": "payment_intent.succeeded",
+            "data": {"object": {"id": "pi_1", "object": "payment_intent"}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(b"whsec_test", f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            "/api/stripe/webhook/", payload, content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def test_replayed_event_is_applied_once(self):
+        first, replay = self.deliver(), self.deliver()
+
+        self.assertEqual(first.json(), {"status": "success"})
+        self.assertEqual(replay.json(), {"status": "duplicate"})
+        self.assertEqual(self.handler.call_count, 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'paid')
+        self.assertEqual(list(Payment.objects.values_list("status", flat=True)), ["paid"])
+
+    def test_failed_handler_leaves_the_event_unrecorded(self):
+        self.handler.side_effect = DatabaseError("connection lost")
+        self.client.raise_request_exception = False
+
+        self.assertEqual(self.deliver().status_code, 500)
+        self.assertFalse(StripeEvent.objects.exists())
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'approved')
+
+        # Stripe's retry is processed normally
+        self.handler.side_effect = None
+        self.assertEqual(self.deliver().json(), {"status": "success"})
+        self.assertTrue(StripeEvent.objects.get(pk="evt_1").processed_at)
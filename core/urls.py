@@ -1,12 +1,35 @@
+from django.conf import settings
 from django.urls import path
 from core.views import *
+from core.async_views import *
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 
+# Hot reads and I/O-heavy writes run as async views under ASGI
+# (core/async_views.py). ASYNC_API_VIEWS=False falls back to the sync ones.
+if settings.ASYNC_API_VIEWS:
+    task_list_create_view = AsyncTaskListCreateView.as_view()
+    task_complete_view = AsyncCompleteTaskView.as_view()
+    task_pay_view = AsyncPayTaskView.as_view()
+    notification_list_view = AsyncNotificationListView.as_view()
+    unread_notification_count_view = AsyncUnreadNotificationCountView.as_view()
+    business_dashboard = async_business_dashboard_view
+    worker_dashboard = async_worker_dashboard_view
+else:
+    task_list_create_view = TaskListCreateView.as_view()
+    task_complete_view = CompleteTaskView.as_view()
+    task_pay_view = PayTaskView.as_view()
+    notification_list_view = NotificationListView.as_view()
+    unread_notification_count_view = UnreadNotificationCountView.as_view()
+    business_dashboard = business_dashboard_view
+    worker_dashboard = worker_dashboard_view
+
+
 urlpatterns = [
 
     # HEALTH CHECK
     path("health/", HealthCheckView.as_view(), name="health-check"),
+    path("metrics/", metrics_view, name="metrics"),
 
     # AUTH / PROFILE
     path("auth/register/", RegisterView.as_view(), name="register"),
@@ -17,14 +40,21 @@ urlpatterns = [
     path("auth/profile/<str:username>/", PublicProfileView.as_view(), name="public-profile"),
 
     # TASKS
-    path("tasks/", TaskListCreateView.as_view(), name="task-list-create"),
+    path("tasks/", task_list_create_view, name="task-list-create"),
+    path("tasks/search/", TaskSearchView.as_view(), name="task-search"),
+    path("tasks/recommended/", RecommendedTasksView.as_view(), name="task-recommended"),
     path("tasks/<int:pk>/", TaskDetailView.as_view(), name="task-detail"),
 
     # Actions
     path("tasks/<int:pk>/claim/", ClaimTaskView.as_view(), name="task-claim"),
-    path("tasks/<int:pk>/complete/", CompleteTaskView.as_view(), name="task-complete"),
+    path("tasks/<int:pk>/complete/", task_complete_view, name="task-complete"),
     path("tasks/<int:pk>/approve/", ApproveTaskView.as_view(), name="task-approve"),
-    path("tasks/<int:pk>/pay/", PayTaskView.as_view(), name="task-pay"),
+    path("tasks/<int:pk>/pay/", task_pay_view, name="task-pay"),
+    path("tasks/<int:pk>/pay/async/", AsyncPayTaskView.as_view(), name="task-pay-async"),
+
+    # Bulk actions
+    path("tasks/bulk/approve/", BulkApproveTasksView.as_view(), name="task-bulk-approve"),
+    path("tasks/bulk/pay/", BulkPayTasksView.as_view(), name="task-bulk-pay"),
 
     # Discussion
     path("tasks/<int:pk>/comments/", TaskCommentListCreateView.as_view(), name="task-comments"),
@@ -33,14 +63,17 @@ urlpatterns = [
     path("stripe/webhook/", stripe_webhook, name="stripe-webhook"),
 
     # NOTIFICATIONS
-    path("notifications/", NotificationListView.as_view(), name="notification-list"),
+    path("notifications/", notification_list_view, name="notification-list"),
+    path("notifications/archive/", ArchivedNotificationListView.as_view(), name="notification-archive"),
     path("notifications/<int:pk>/read/", MarkNotificationReadView.as_view(), name="notification-read"),
-    path("notifications/unread-count/", UnreadNotificationCountView.as_view(), name="unread-notification-count"),
+    path("notifications/read/", MarkNotificationsReadView.as_view(), name="notification-read-batch"),
+    path("notifications/read-all/", MarkAllNotificationsReadView.as_view(), name="notification-read-all"),
+    path("notifications/unread-count/", unread_notification_count_view, name="unread-notification-count"),
 
     # USERS (ADMIN ONLY)
     path("users/", GetAllUsers.as_view(), name="all-users"),
 
     # Dashboard Stats
-    path("dashboard/business/", business_dashboard_view),
-    path("dashboard/worker/", worker_dashboard_view),
+    path("dashboard/business/", business_dashboard),
+    path("dashboard/worker/", worker_dashboard),
 ]
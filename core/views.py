@@ -3,17 +3,18 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.http import JsonResponse
-from django.db.models import Q
-from django.db import transaction
-# from channels.layers import get_channel_layer
-# from asgiref.sync import async_to_sync
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.db.models import Exists, Q, Subquery
+from django.db import DatabaseError, transaction
 
 
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 
@@ -22,15 +23,80 @@ from rest_framework.decorators import api_view, permission_classes
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+import hashlib
+import itertools
+import json
 import stripe
 
 from .models import *
 from .serializers import *
 from .services import *
+from .pagination import (
+    ArchivedNotificationPagination,
+    TaskCommentPagination,
+    TaskFeedPagination,
+    TaskSearchPagination,
+)
+from .search import search_tasks
+from .storage import StorageError
+from .recommendations import recommended_tasks
+from .metrics import registry as metrics_registry
+
+
+# Applies the select_related/prefetch_related declared by the view's
+# serializer (EagerLoadingMixin) to every list and detail lookup.
+# Hooked into filter_queryset() because both list() and get_object()
+# go through it, while views keep overriding get_queryset() freely.
+class EagerLoadingQuerysetMixin:
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+
+# CONDITIONAL GETs
+# Polling clients mostly get unchanged data back. A list's ETag combines
+# the user, the query string and a version counter of the data behind it
+# (see VERSION COUNTERS in services.py): the task feed version, the task's
+# version for its comments, the user's notification version. Reading it is
+# one cache get, so an unchanged list is answered with a 304 before any
+# row is fetched or serialized. No Last-Modified: it would need a scan.
+
+def list_etag(request, version):
+    raw = f"{request.user.id}|{request.get_full_path()}|{version}"
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def not_modified_response(request, etag):
+    # The 304, or None if the client's copy is stale
+    response = get_conditional_response(request, etag=etag)
+    return add_validators(response, etag) if response is not None else None
+
+
+def add_validators(response, etag):
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"  # always revalidate
+    return response
+
+
+class ConditionalListMixin:
+    def get_list_version(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        # Read before the rows: a write landing in between moves the
+        # version, so the stale body is never kept under the new ETag
+        etag = list_etag(request, self.get_list_version())
+        return (
+            not_modified_response(request, etag)
+            or add_validators(super().list(request, *args, **kwargs), etag)
+        )
 
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
 # HEALTH CHECK
 class HealthCheckView(APIView):
     authentication_classes = []
@@ -40,47 +106,78 @@ class HealthCheckView(APIView):
         return Response({"status": "awake"})
 
 
+
+# METRICS (Prometheus text format, see core/metrics.py)
+@require_http_methods(["GET"])
+def metrics_view(request):
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not constant_time_compare(request.headers.get("Authorization", ""), expected):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404
+
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # TASK LIST + CREATE
-class TaskListCreateView(generics.ListCreateAPIView):
-    serializer_class = TaskSerializer
-    permission_classes = [IsAuthenticated]
+def task_feed_queryset(user, query_params):
+    # Shared by TaskListCreateView and AsyncTaskListCreateView
+    queryset = Task.objects.all()
 
-    def get_queryset(self):
-        user = self.request.user # Get the logged-in user making the request
-        queryset = Task.objects.all()
+    status = query_params.get('status')
+    if status == 'open':
+        queryset = queryset.filter(status=status)
 
-        status = self.request.query_params.get('status')
-        if status == 'open':
-            queryset = queryset.filter(status=status)
+    type_filter = query_params.get('type')
 
-        type_filter = self.request.query_params.get('type')
+    if type_filter == 'posted':
+        queryset = queryset.filter(
+            Q(created_by=user) & Q(status__in=['open'])
+        )
 
-        if type_filter == 'posted':
-            queryset = queryset.filter(
-                Q(created_by=user) & Q(status__in=['open'])
-            )
+    if type_filter == 'claimed':
+        # Users claimed tasks that are NOT completed, approved, or paid
+        queryset = queryset.filter(
+            (Q(claimed_by=user) & ~Q(status__in=['completed', 'approved', 'paid']))
+            | (Q(created_by=user) & Q(status__in=['claimed']))
+        )
 
-        if type_filter == 'claimed':
-            # Users claimed tasks that are NOT completed, approved, or paid
-            queryset = queryset.filter(
-                (Q(claimed_by=user) & ~Q(status__in=['completed', 'approved', 'paid']))
-                | (Q(created_by=user) & Q(status__in=['claimed']))
-            )
+    elif type_filter == 'completed':
+        # Tasks claimed by user that are completed
+        queryset = queryset.filter(
+             (Q(claimed_by=user) & Q(status__in=['completed', 'approved']))
+            | (Q(created_by=user) & Q(status__in=['completed', 'approved']))
+        )
 
-        elif type_filter == 'completed':
-            # Tasks claimed by user that are completed
-            queryset = queryset.filter(
-                 (Q(claimed_by=user) & Q(status__in=['completed', 'approved']))
-                | (Q(created_by=user) & Q(status__in=['completed', 'approved']))
-            )
+    elif type_filter == 'history':
+        queryset = queryset.filter(
+            Q(created_by=user) | Q(claimed_by=user),
+            status__in=['paid']
+        )
 
-        elif type_filter == 'history':
-            queryset = queryset.filter(
-                Q(created_by=user) | Q(claimed_by=user),
-                status__in=['paid']
-            )
+    return queryset.order_by('-updated_at', '-id')
+
+
+class TaskListCreateView(ConditionalListMixin, EagerLoadingQuerysetMixin, generics.ListCreateAPIView):
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TaskFeedPagination  # opt-in keyset pages on (updated_at, id)
+
+    def get_queryset(self):
+        user = self.request.user # Get the logged-in user making the request
+        return task_feed_queryset(user, self.request.query_params)
+
+    def get_list_version(self):
+        return task_feed_version()
 
-        return queryset.order_by('-updated_at')
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('type') == 'history':
+            return task_history_response(request)
+        return super().list(request, *args, **kwargs)
     
     """
     perform_create() is a hook method that runs automatically when a new object is being created.
@@ -96,12 +193,106 @@ class TaskListCreateView(generics.ListCreateAPIView):
         if self.request.user.userprofile.role != 'business':
             raise PermissionDenied("Only business users can create tasks.")
 
-        task = serializer.save(created_by=self.request.user)
-        invalidate_dashboard_cache(task)
+        save_new_task(serializer, self.request.user)
+
+
+# TASK HISTORY
+# type=history spans the live table and the archive: paid tasks move to
+# ArchivedTask after ARCHIVE_AFTER_DAYS (see core/archive.py). Both sides
+# are keyset paged on (updated_at, id) and merged into one page.
+def task_history_response(request):
+    etag = list_etag(request, task_feed_version())
+    response = not_modified_response(request, etag)
+    if response is not None:
+        return response
+
+    user = request.user
+    querysets = [
+        TaskSerializer.setup_eager_loading(queryset)
+        for queryset in (
+            task_feed_queryset(user, {'type': 'history'}),
+            ArchivedTask.objects.filter(Q(created_by=user) | Q(claimed_by=user)),
+        )
+    ]
+
+    paginator = TaskFeedPagination()
+    page = paginator.paginate_querysets(querysets, request)
+    if page is not None:
+        response = paginator.get_paginated_response(TaskSerializer(page, many=True).data)
+    else:
+        tasks = sorted(
+            itertools.chain(*querysets),
+            key=lambda task: (task.updated_at, task.id),
+            reverse=True,
+        )
+        response = Response(TaskSerializer(tasks, many=True).data)
+
+    return add_validators(response, etag)
+
+
+@transaction.atomic
+def save_new_task(serializer, user):
+    task = serializer.save(created_by=user)
+    record_task_transition(task, None, 'open', actor=user)
+    return task
+
+
+# TASK SEARCH
+# Ranked full-text search over title + description (see core/search.py),
+# combined with price / duration / status filters. Open tasks are visible to
+# everyone, other statuses only to their creator and worker, as in
+# TaskDetailView.
+SEARCH_RANGE_FILTERS = {
+    'min_price': 'price__gte',
+    'max_price': 'price__lte',
+    'min_duration': 'duration_minutes__gte',
+    'max_duration': 'duration_minutes__lte',
+}
+
+
+class TaskSearchView(EagerLoadingQuerysetMixin, generics.ListAPIView):
+    serializer_class = TaskSearchResultSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TaskSearchPagination
+
+    def get_queryset(self):
+        params = TaskSearchQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        user = self.request.user
+
+        queryset = Task.objects.filter(status=filters['status'])
+        if filters['status'] != 'open':
+            queryset = queryset.filter(Q(created_by=user) | Q(claimed_by=user))
+
+        for param, lookup in SEARCH_RANGE_FILTERS.items():
+            if param in filters:
+                queryset = queryset.filter(**{lookup: filters[param]})
+
+        return search_tasks(queryset, filters['q'])
+
+
+# RECOMMENDED TASKS
+# Served from the worker's precomputed candidate list (core/recommendations.py).
+class RecommendedTasksView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.userprofile.role != 'worker':
+            raise PermissionDenied("Only workers get task recommendations.")
+
+        try:
+            limit = int(request.query_params.get('limit', settings.TASK_FEED_PAGE_SIZE))
+        except ValueError:
+            limit = settings.TASK_FEED_PAGE_SIZE
+        limit = max(1, min(limit, settings.TASK_FEED_MAX_PAGE_SIZE))
+
+        tasks = recommended_tasks(request.user.id, limit)
+        return Response(TaskRecommendationSerializer(tasks, many=True).data)
 
 
 # TASK DETAIL
-class TaskDetailView(generics.RetrieveDestroyAPIView):
+class TaskDetailView(EagerLoadingQuerysetMixin, generics.RetrieveDestroyAPIView):
     serializer_class = TaskDetailSerializer
     permission_classes = [IsAuthenticated]
 
@@ -113,6 +304,20 @@ class TaskDetailView(generics.RetrieveDestroyAPIView):
             Q(claimed_by=user)
         )
     
+    # Reads come from the versioned task detail cache (services.py); the
+    # version is the ETag, so polling an unchanged task gets a bare 304.
+    def retrieve(self, request, *args, **kwargs):
+        payload, version = task_detail(kwargs['pk'])
+        if payload is None or not can_view_task(payload, request.user):
+            raise Http404
+
+        etag = quote_etag(f"{kwargs['pk']}-{version}")
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(payload["data"])
+
+        return add_validators(response, etag)
+
     # Why we need get_queyset() here?
     # If a user requests /tasks/7/:
     # Task 7 exists but is not in this filtered queryset
@@ -122,6 +327,7 @@ class TaskDetailView(generics.RetrieveDestroyAPIView):
     # DRF would try Task.objects.all() by default
     # Anyone could access any task by PK → security hole
     
+    @transaction.atomic
     def perform_destroy(self, instance):
         # Why we need perform_destroy() here?
         # Even after get_queryset() filters accessible tasks, we still need
@@ -143,73 +349,113 @@ class TaskDetailView(generics.RetrieveDestroyAPIView):
         if instance.status != 'open':
             raise PermissionDenied("Only open tasks can be deleted")
         
-        invalidate_dashboard_cache(instance)
+        record_task_transition(instance, 'open', None, actor=self.request.user)
         instance.delete()
             
 
 
 # CLAIM TASK
+# A popular task gets many claims at once. Instead of queueing them all on
+# the row lock, a claim is one conditional UPDATE ... WHERE status='open':
+# the first one to match wins and the others match 0 rows, so they only
+# wait for the winner's short transaction (UPDATE + outbox row). The worker
+# role check is an EXISTS subquery inside that UPDATE. The task is read
+# back only for the winner, or to explain why a claim failed.
+# Notifications and dashboard counters follow from the outbox.
 class ClaimTaskView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def patch(self, request, pk):
-        task = get_object_or_404(
-            Task.objects.select_for_update(),
-            pk=pk,
-            status='open'
+        task = claim_task(pk, request.user)
+        if task is None:
+            return claim_failed_response(pk, request.user)
+
+        return Response(
+            TaskSerializer(task).data,
+            status=status.HTTP_200_OK
         )
 
-        # Role check
-        if request.user.userprofile.role != 'worker':
-            raise PermissionDenied("Only workers can claim tasks.")
 
-        # Creator cannot claim own task
-        if task.created_by == request.user:
-            return Response(
-                {"error": "You cannot claim your own task"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+def claimable_tasks(pk, user):
+    return Task.objects.filter(
+        Exists(UserProfile.objects.filter(user=user, role='worker')),
+        pk=pk,
+        status='open',
+    ).exclude(created_by=user)
 
-        # Update task
-        task.claimed_by = request.user
-        task.status = 'claimed'
-        task.save()
 
-        create_notification(
-            recipient=task.created_by,
-            task=task,
-            type='task_claimed',
-            message=f"Task '{task.title}' has been claimed.",
-            actor=request.user
+@transaction.atomic
+def claim_task(pk, user):
+    """
+    Claim the task for `user`. Returns it, or None if the claim failed.
+    """
+    strategy = settings.TASK_CLAIM_STRATEGY
+
+    if strategy == 'update':
+        claimed = claimable_tasks(pk, user).update(
+            claimed_by=user,
+            status='claimed',
+            updated_at=timezone.now(),  # update() skips auto_now
         )
-        invalidate_dashboard_cache(task)
-
-        # SEND WEBSOCKET NOTIFICATION TO BUSINESS OWNER
-        # channel_layer = get_channel_layer()
-
-        # async_to_sync(channel_layer.group_send)(
-        #     f"user_{task.created_by.id}",   # business owner's group
-        #     {
-        #         "type": "send_notification",
-        #         "data": {
-        #             "event": "TASK_CLAIMED",
-        #             "task_id": task.id,
-        #             "task_title": task.title,
-        #             "claimed_by": request.user.username,
-        #             "message": (
-        #                 f"Your task '{task.title}' was claimed by "
-        #                 f"{request.user.username}"
-        #             )
-        #         }
-        #     }
-        # )
+        if not claimed:
+            return None
+        task = Task.objects.select_related('created_by').get(pk=pk)
+        task.claimed_by = user
+
+    else:
+        # Fallback: row lock, but losers give up at once instead of queueing
+        try:
+            with transaction.atomic():
+                task = (
+                    claimable_tasks(pk, user)
+                    .select_related('created_by')
+                    .select_for_update(
+                        skip_locked=strategy == 'skip_locked',
+                        nowait=strategy == 'nowait',
+                        of=('self',),
+                    )
+                    .first()
+                )
+        except DatabaseError:  # NOWAIT: another claim holds the row
+            return None
+        if task is None:
+            return None
+
+        task.claimed_by = user
+        task.status = 'claimed'
+        task.save(update_fields=['claimed_by', 'status', 'updated_at'])
 
+    record_task_transition(task, 'open', 'claimed', actor=user)
+    return task
+
+
+def claim_failed_response(pk, user):
+    """
+    Same answers as before the lock-free claim: 404 if the task isn't open,
+    403 for non-workers, 400 for the task's own creator. A task that is
+    still open was lost to a concurrent claim holding the lock (409).
+    """
+    task = Task.objects.filter(pk=pk, status='open').annotate(
+        role=Subquery(UserProfile.objects.filter(user=user).values('role')[:1])
+    ).values('created_by_id', 'role').first()
+
+    if task is None:
+        raise Http404
+
+    if task['role'] != 'worker':
+        raise PermissionDenied("Only workers can claim tasks.")
+
+    if task['created_by_id'] == user.id:
         return Response(
-            TaskSerializer(task).data,
-            status=status.HTTP_200_OK
+            {"error": "You cannot claim your own task"},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
+    return Response(
+        {"error": "Task is being claimed by someone else"},
+        status=status.HTTP_409_CONFLICT
+    )
+
 
 
 # COMPLETE TASK (UPLOAD PROOF)
@@ -217,7 +463,6 @@ class CompleteTaskView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
-    @transaction.atomic
     def patch(self, request, pk):
         task = get_object_or_404(
             Task.objects.all(),
@@ -245,34 +490,25 @@ class CompleteTaskView(APIView):
                 {"error": "Proof image and completion details are required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Add these 3 debug lines
-        # from django.core.files.storage import default_storage
-        # print("🎯 RENDER STORAGE:", default_storage.__class__.__name__)
-        # print("🎯 SUPABASE_URL:", getattr(settings, 'SUPABASE_URL', 'MISSING'))
-        # print("🎯 BUCKET:", getattr(settings, 'SUPABASE_BUCKET', 'MISSING'))
-
-        # Create completion
-        TaskCompletion.objects.create(
-            task=task,
-            completed_by=request.user,
-            proof_image=proof_image,
-            completion_details=completion_details
-        )
-
-        # Update task status
-        task.status = 'completed'
-        task.save()
 
-        create_notification(
-            recipient=task.created_by,
-            task=task,
-            type='task_completed',
-            message=f"Task '{task.title}' has been completed.",
-            actor=request.user
-        )
+        # Strip EXIF, downsize and build the thumbnail
+        try:
+            image, thumbnail = prepare_proof_images(proof_image)
+        except InvalidImage:
+            return Response(
+                {"error": "Proof image is not a valid image"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        invalidate_dashboard_cache(task)
+        try:
+            task = store_task_completion(
+                pk, request.user, completion_details, image, thumbnail
+            )
+        except StorageError:
+            return Response(
+                {"error": "Proof image could not be stored, please try again"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
         return Response(
             {
@@ -283,29 +519,95 @@ class CompleteTaskView(APIView):
         )
 
 
+def store_task_completion(pk, user, completion_details, image, thumbnail):
+    # Shared by CompleteTaskView and AsyncCompleteTaskView.
+    #
+    # Upload outside the transaction so a slow Supabase never holds
+    # a row lock. Deferred uploads are attached after commit instead.
+    deferred = settings.SUPABASE_DEFERRED_UPLOADS
+    if deferred:
+        proof_name, thumbnail_name = '', ''
+    else:
+        proof_name, thumbnail_name = store_proof_images(image, thumbnail)
+
+    try:
+        with transaction.atomic():
+            # Re-check under lock: the task may have changed during the upload
+            task = get_object_or_404(
+                Task.objects.select_for_update(),
+                pk=pk,
+                claimed_by=user,
+                status='claimed'
+            )
+
+            # Create completion
+            completion = TaskCompletion.objects.create(
+                task=task,
+                completed_by=user,
+                proof_image=proof_name,
+                proof_thumbnail=thumbnail_name,
+                completion_details=completion_details
+            )
+
+            # Update task status
+            task.status = 'completed'
+            task.save()
+
+            record_task_transition(task, 'claimed', 'completed', actor=user)
+
+            if deferred:
+                defer_proof_image_upload(completion.pk, image, thumbnail)
+    except Exception:
+        delete_proof_images(proof_name, thumbnail_name)
+        raise
+
+    return task
+
+
 # COMMENT ON TASK
-class TaskCommentListCreateView(generics.ListCreateAPIView):
+class TaskCommentListCreateView(ConditionalListMixin, EagerLoadingQuerysetMixin, generics.ListCreateAPIView):
     serializer_class = TaskCommentSerializer
     permission_classes = [IsAuthenticated]
-
+    pagination_class = TaskCommentPagination
+
+    # Only the task's owner and its worker take part in the thread. One query
+    # for just the two ids, shared by reading and posting.
+    def check_participant(self, message):
+        task = Task.objects.filter(pk=self.kwargs['pk']).values(
+            'created_by_id', 'claimed_by_id'
+        ).first()
+
+        if task is None:
+            raise Http404
+        if self.request.user.id not in (task['created_by_id'], task['claimed_by_id']):
+            raise PermissionDenied(message)
+
+    def get_list_version(self):
+        # Before the 304: non-participants must not learn that nothing changed
+        self.check_participant("Not allowed to view comments")
+        return task_version(self.kwargs['pk'])
+
+    # ?since=<comment id> returns only newer comments (chat-style polling);
+    # without it the thread is paged from the start via ?cursor=.
+    # (list() has already checked the participant in get_list_version)
     def get_queryset(self):
-        task = get_object_or_404(Task, pk=self.kwargs['pk'])
-        user = self.request.user
+        queryset = TaskComment.objects.filter(task_id=self.kwargs['pk'])
 
-        if user != task.created_by and user != task.claimed_by:
-            raise PermissionDenied("Not allowed to view comments")
+        since = self.request.query_params.get('since')
+        if since is not None:
+            try:
+                queryset = queryset.filter(id__gt=int(since))
+            except ValueError:
+                raise ValidationError({"since": "Must be a comment id."})
 
-        return task.comments.order_by('created_at')
+        return queryset.order_by('created_at', 'id')
 
     # This perform_create() method is called only after the serializer validates the incoming data for Comment. Once the data is validated, this method checks id the requested user is a Owner or Worker of the Task with the given pk. 
     def perform_create(self, serializer):
-        task = get_object_or_404(Task, pk=self.kwargs['pk'])
-        user = self.request.user
-
-        if user != task.created_by and user != task.claimed_by:
-            raise PermissionDenied("Not allowed to comment")
+        self.check_participant("Not allowed to comment")
 
-        serializer.save(task=task, user=user)
+        serializer.save(task_id=self.kwargs['pk'], user=self.request.user)
+        bump_task_version(self.kwargs['pk'])
 
 
 
@@ -313,9 +615,10 @@ class TaskCommentListCreateView(generics.ListCreateAPIView):
 class ApproveTaskView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def patch(self, request, pk):
         task = get_object_or_404(
-            Task,
+            Task.objects.select_for_update(),
             pk=pk,
             created_by=request.user,
             status='completed'
@@ -328,15 +631,7 @@ class ApproveTaskView(APIView):
         task.status = 'approved'
         task.save()
 
-        create_notification(
-            recipient=task.claimed_by,
-            task=task,
-            type='task_approved',
-            message=f"Task '{task.title}' has been approved.",
-            actor=request.user
-        )
-
-        invalidate_dashboard_cache(task)
+        record_task_transition(task, 'completed', 'approved', actor=request.user)
 
         return Response({
             "message": "✅ Task approved",
@@ -362,43 +657,120 @@ class PayTaskView(APIView):
         if request.user.userprofile.role != 'business':
             raise PermissionDenied("Only business users can pay for tasks.")
 
-        # Get business profile for billing details
-        business_profile = request.user.userprofile
+        # Billing details: the cached auth profile only carries the role
+        business_profile = UserProfile.objects.get(user=request.user)
+
+        # Reuses the task's open PaymentIntent, else creates one (idempotent)
+        try:
+            intent = get_or_create_payment_intent([task], request.user)
+        except PaymentInProgress:
+            return payment_in_progress_response()
+
+        return Response(
+            payment_intent_response(intent, request.user, business_profile)
+        )
+
+
+def payment_in_progress_response():
+    return Response(
+        {"error": "Payment already in progress"},
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+# BULK APPROVE / PAY
+# Month-end payouts: validate every task in one query, move them all with
+# a single UPDATE and one outbox INSERT. Each dashboard is updated once on
+# commit and the outbox dispatcher creates the notifications with
+# bulk_create. A bulk payment is one PaymentIntent for the whole batch.
+def invalid_task_ids(task_ids, tasks):
+    found = {task.id for task in tasks}
+    return [task_id for task_id in task_ids if task_id not in found]
+
+
+class BulkApproveTasksView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def patch(self, request):
+        if request.user.userprofile.role != 'business':
+            raise PermissionDenied("Only business users can approve tasks.")
+
+        serializer = IdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task_ids = list(dict.fromkeys(serializer.validated_data["ids"]))
 
-        # Create Stripe PaymentIntent
-        intent = stripe.PaymentIntent.create(
-            amount=int(task.price * 100),  # in smallest currency unit
-            currency="inr",
-            description=f"Payment for task {task.title}",
-            automatic_payment_methods={"enabled": True},
-            receipt_email=request.user.email, 
+        tasks = list(
+            Task.objects.select_for_update().filter(
+                id__in=task_ids,
+                created_by=request.user,
+                status='completed'
+            )
         )
 
-        # Record payment in DB (status pending)
-        Payment.objects.create(
-            task=task,
-            stripe_payment_intent_id=intent.id,
-            amount=task.price,
-            status="pending",
+        invalid = invalid_task_ids(task_ids, tasks)
+        if invalid:
+            return Response(
+                {"error": "Some tasks can't be approved", "invalid_ids": invalid},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        Task.objects.filter(id__in=task_ids).update(
+            status='approved',
+            updated_at=timezone.now()
         )
+        record_task_transitions_bulk(tasks, 'completed', 'approved', actor=request.user)
 
-        # Return client_secret + billing details for frontend
         return Response({
-            "client_secret": intent.client_secret,
-            "billing_details": {
-                "name": request.user.username,
-                "address": {
-                    "line1": business_profile.address_line1,
-                    "city": business_profile.city,
-                    "country": business_profile.country,
-                    "postal_code": business_profile.postal_code,
-                }
-            }
+            "message": f"✅ {len(tasks)} tasks approved",
+            "approved": task_ids,
         })
-    
+
+
+class BulkPayTasksView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request):
+        # Role check: only business can trigger payment
+        if request.user.userprofile.role != 'business':
+            raise PermissionDenied("Only business users can pay for tasks.")
+
+        business_profile = UserProfile.objects.get(user=request.user)
+
+        serializer = IdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task_ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+
+        tasks = list(
+            Task.objects.filter(
+                id__in=task_ids,
+                created_by=request.user,
+                status='approved'
+            )
+        )
+
+        invalid = invalid_task_ids(task_ids, tasks)
+        if invalid:
+            return Response(
+                {"error": "Some tasks can't be paid", "invalid_ids": invalid},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # A retry of the same batch gets its intent back; open intents of
+        # other payments covering these tasks are superseded
+        try:
+            intent = get_or_create_payment_intent(tasks, request.user)
+        except PaymentInProgress:
+            return payment_in_progress_response()
+
+        return Response({
+            **payment_intent_response(intent, request.user, business_profile),
+            "task_ids": task_ids,
+        })
+
 
 # STRIPE WEBHOOK
-# This is called by Stripe after payment is completed. It verifies the webhook, updates payment and task status in DB, then sends a websocket notification to the worker about the payment.
+# This is called by Stripe after payment is completed. It verifies the webhook, records the event in the StripeEvent ledger and updates payment and task status in DB exactly once per event id (see services.process_stripe_event).
 @csrf_exempt 
 @require_http_methods(["POST"])
 def stripe_webhook(request):
@@ -412,31 +784,22 @@ def stripe_webhook(request):
     except Exception:
         return JsonResponse({"error": "Invalid webhook"}, status=400)
 
-    if event["type"] == "payment_intent.succeeded":
-        intent = event["data"]["object"]
-
-        payment = Payment.objects.get(
-            stripe_payment_intent_id=intent["id"]
-        )
-        payment.status = "paid"
-        payment.save()
-
-        task = payment.task
-        task.status = "paid"
-        task.updated_at = timezone.now()
-        task.save()
+    if event["type"] not in STRIPE_EVENT_HANDLERS:
+        return JsonResponse({"status": "ignored"})
 
-        create_notification(
-            recipient=task.claimed_by,
-            task=task,
-            type='task_paid',
-            message=f"Task '{task.title}' has been paid.",
-            actor=task.created_by
-        )
+    # Acknowledge fast: the outbox dispatcher does the actual work
+    if settings.STRIPE_WEBHOOK_DEFERRED:
+        defer_stripe_event(event)
+        return JsonResponse({"status": "accepted"})
 
-        invalidate_dashboard_cache(task)
+    # A failing handler rolls its ledger entry back too, so Stripe's retry
+    # is processed as a new event
+    with transaction.atomic():
+        record_stripe_event(event)
+        processed = process_stripe_event(event["id"])
 
-        print(f"✅ Task {task.id} PAID")
+    if not processed:
+        return JsonResponse({"status": "duplicate"})
 
     return JsonResponse({"status": "success"})
 
@@ -464,7 +827,7 @@ class ProfileView(generics.RetrieveAPIView):
     # RetrieveAPIView is designed to return one object only.
     # get_object() tells the view: “Which single database object should I return?”
     def get_object(self):
-        return self.request.user.userprofile 
+        return get_object_or_404(UserProfile.objects.select_related('user'), user=self.request.user)
         # For the logged in user, it first fetches the related UserProfile object, then uses ProfileSerializer to convert that UserProfile instance into JSON data to send back in the API response.
 
 
@@ -474,7 +837,8 @@ class ProfileUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user.userprofile
+        # The whole profile, not the role-only one cached for authentication
+        return get_object_or_404(UserProfile.objects.select_related('user'), user=self.request.user)
 
 
 class PublicProfileView(generics.RetrieveAPIView):
@@ -486,28 +850,43 @@ class PublicProfileView(generics.RetrieveAPIView):
         return get_object_or_404(UserProfile, user=user)
 
 # Notifications
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ConditionalListMixin, EagerLoadingQuerysetMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_list_version(self):
+        return notification_version(self.request.user.id)
+
     def get_queryset(self):
         return Notification.objects.filter(
             recipient=self.request.user
         ).order_by("-created_at")
 
 
+class ArchivedNotificationListView(EagerLoadingQuerysetMixin, generics.ListAPIView):
+    serializer_class = ArchivedNotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ArchivedNotificationPagination
+
+    def get_queryset(self):
+        return ArchivedNotification.objects.filter(recipient=self.request.user)
+
+
 class MarkNotificationReadView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
-        notification = get_object_or_404(
-            Notification,
+        notifications = Notification.objects.filter(
             pk=pk,
             recipient=request.user  # 🔐 security check
         )
 
-        notification.is_read = True
-        notification.save()
+        # Single UPDATE; only an unread -> read change touches the counter
+        if notifications.filter(is_read=False).update(is_read=True):
+            adjust_unread_count(request.user.id, -1)
+            bump_notification_version(request.user.id)
+        elif not notifications.exists():
+            raise Http404
 
         return Response(
             {"message": "Notification marked as read"},
@@ -515,14 +894,48 @@ class MarkNotificationReadView(APIView):
         )
 
 
-class UnreadNotificationCountView(APIView):
+class MarkNotificationsReadView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        count = Notification.objects.filter(
+    def patch(self, request):
+        serializer = IdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # One UPDATE for the whole batch; ids of other users are ignored
+        updated = Notification.objects.filter(
+            recipient=request.user,
+            is_read=False,
+            id__in=serializer.validated_data["ids"]
+        ).update(is_read=True)
+
+        if updated:
+            adjust_unread_count(request.user.id, -updated)
+            bump_notification_version(request.user.id)
+
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+
+class MarkAllNotificationsReadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request):
+        updated = Notification.objects.filter(
             recipient=request.user,
             is_read=False
-        ).count()
+        ).update(is_read=True)
+
+        if updated:
+            adjust_unread_count(request.user.id, -updated)
+            bump_notification_version(request.user.id)
+
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+
+class UnreadNotificationCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        count = unread_notification_count(request.user.id)
 
         return Response({"unread_count": count})
 
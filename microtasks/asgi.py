@@ -13,15 +13,16 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "microtasks.settings")
 
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-
-import core.routing
 
+# Initialize Django before importing anything that touches models
 django_asgi_app = get_asgi_application()
 
+from core.middleware import JWTAuthMiddlewareStack
+import core.routing
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(core.routing.websocket_urlpatterns)
     ),
 })
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
-from decouple import config
+from decouple import Choices, config
 import dj_database_url
 from django.core.management.utils import get_random_secret_key
 
@@ -45,8 +45,8 @@ CSRF_TRUSTED_ORIGINS = [
 
 INSTALLED_APPS = [
     'corsheaders',                  # added for cors
-    # 'daphne',                       # added for ASGI
-    # 'channels',                     # added for WebSockets
+    'daphne',                       # added for ASGI
+    'channels',                     # added for WebSockets
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -54,11 +54,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'adrf',                         # async DRF views (core/async_views.py)
     'rest_framework_simplejwt',
     'core', 
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',  # metrics + Server-Timing
     'corsheaders.middleware.CorsMiddleware',  # added for cors
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,7 +69,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    # 'core.middleware.RequestLogMiddleware',
 ]
 
 ROOT_URLCONF = 'microtasks.urls'
@@ -89,6 +90,9 @@ TEMPLATES = [
 
 # WSGI_APPLICATION = 'microtasks.wsgi.application'
 
+# Route the hot / I/O-heavy endpoints to core/async_views.py
+ASYNC_API_VIEWS = config('ASYNC_API_VIEWS', default=True, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -125,6 +129,35 @@ CACHES = {
     }
 }
 
+# Dashboard counter hashes expire after this many seconds and are
+# rebuilt from the DB, which bounds any drift (see core/services.py)
+DASHBOARD_COUNTER_TTL = config('DASHBOARD_COUNTER_TTL', default=3600, cast=int)
+
+# Cached per-user unread notification counters
+UNREAD_COUNT_TTL = config('UNREAD_COUNT_TTL', default=3600, cast=int)
+
+# Versioned task detail payloads (see core/services.py)
+TASK_DETAIL_CACHE_TTL = config('TASK_DETAIL_CACHE_TTL', default=600, cast=int)
+
+# Precomputed worker recommendations (see core/recommendations.py)
+RECOMMENDATION_LIST_SIZE = config('RECOMMENDATION_LIST_SIZE', default=200, cast=int)
+RECOMMENDATION_TTL = config('RECOMMENDATION_TTL', default=86400, cast=int)
+
+# Transactional outbox dispatcher (manage.py dispatch_outbox)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+OUTBOX_POLL_INTERVAL = config('OUTBOX_POLL_INTERVAL', default=1.0, cast=float)
+# Failed events wait OUTBOX_RETRY_DELAY seconds, doubling per attempt, capped
+OUTBOX_RETRY_DELAY = config('OUTBOX_RETRY_DELAY', default=30, cast=int)
+OUTBOX_MAX_RETRY_DELAY = config('OUTBOX_MAX_RETRY_DELAY', default=3600, cast=int)
+# How long a proof upload may run before another dispatcher may claim it
+OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=300, cast=int)
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)
+
+# Cold data archival (manage.py archive_cold_data)
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=90, cast=int)
+ARCHIVE_BATCH_SIZE = config('ARCHIVE_BATCH_SIZE', default=500, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -166,6 +199,24 @@ STATIC_URL = 'static/'
 SUPABASE_URL = config('SUPABASE_URL')
 SUPABASE_API_KEY = config('SUPABASE_API_KEY') 
 SUPABASE_BUCKET = config('SUPABASE_BUCKET', default='taskflow-marketplace-completion-proofs')
+SUPABASE_CONNECT_TIMEOUT = config('SUPABASE_CONNECT_TIMEOUT', default=3.05, cast=float)
+SUPABASE_READ_TIMEOUT = config('SUPABASE_READ_TIMEOUT', default=30, cast=float)
+SUPABASE_UPLOAD_RETRIES = config('SUPABASE_UPLOAD_RETRIES', default=2, cast=int)
+SUPABASE_POOL_SIZE = config('SUPABASE_POOL_SIZE', default=10, cast=int)
+SUPABASE_METADATA_TTL = config('SUPABASE_METADATA_TTL', default=30, cast=int)  # exists/size cache
+
+# Upload proof images from the outbox dispatcher after the completion commits
+SUPABASE_DEFERRED_UPLOADS = config('SUPABASE_DEFERRED_UPLOADS', default=False, cast=bool)
+
+# Proof image normalization (see core/images.py): WEBP or JPEG
+PROOF_IMAGE_FORMAT = config(
+    'PROOF_IMAGE_FORMAT',
+    default='WEBP',
+    cast=Choices(['WEBP', 'JPEG'], cast=str.upper),
+)
+PROOF_IMAGE_QUALITY = config('PROOF_IMAGE_QUALITY', default=80, cast=int)
+PROOF_IMAGE_MAX_DIMENSION = config('PROOF_IMAGE_MAX_DIMENSION', default=1600, cast=int)
+PROOF_THUMBNAIL_SIZE = config('PROOF_THUMBNAIL_SIZE', default=320, cast=int)
 
 # DEFAULT_FILE_STORAGE = 'core.storage.SupabaseStorage'
 # Django 5.2 REQUIRED format
@@ -209,22 +260,48 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# Task feed keyset pagination (see core/pagination.py)
+TASK_FEED_PAGE_SIZE = config('TASK_FEED_PAGE_SIZE', default=20, cast=int)
+TASK_FEED_MAX_PAGE_SIZE = config('TASK_FEED_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Task comment threads, oldest first (see core/pagination.py)
+COMMENT_PAGE_SIZE = config('COMMENT_PAGE_SIZE', default=50, cast=int)
+COMMENT_MAX_PAGE_SIZE = config('COMMENT_MAX_PAGE_SIZE', default=200, cast=int)
+
+# How ClaimTaskView resolves races for the same task:
+# 'update'      - one conditional UPDATE ... WHERE status='open' (default)
+# 'skip_locked' - SELECT ... FOR UPDATE SKIP LOCKED, losers fail fast
+# 'nowait'      - SELECT ... FOR UPDATE NOWAIT, losers fail fast
+TASK_CLAIM_STRATEGY = config(
+    'TASK_CLAIM_STRATEGY',
+    default='update',
+    cast=Choices(['update', 'skip_locked', 'nowait']),
+)
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),  # 1 day
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),     # 1 week
+    'TOKEN_OBTAIN_SERIALIZER': 'core.authentication.RoleTokenObtainPairSerializer',
 }
 
+# User + profile cached per authenticated user (see core/authentication.py)
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=300, cast=int)
+
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+STRIPE_TIMEOUT = config('STRIPE_TIMEOUT', default=10, cast=int)  # seconds per Stripe API call
+STRIPE_MAX_NETWORK_RETRIES = config('STRIPE_MAX_NETWORK_RETRIES', default=2, cast=int)
+# Only record webhook events and let the outbox dispatcher process them
+STRIPE_WEBHOOK_DEFERRED = config('STRIPE_WEBHOOK_DEFERRED', default=False, cast=bool)
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -234,15 +311,23 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 
+# Prometheus scrape token for /api/metrics/ (Authorization: Bearer <token>).
+# Without one the endpoint is only served when DEBUG is on.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Requests slower than this (ms) are logged at WARNING; the rest at DEBUG
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+
+
 # Channels
-# ASGI_APPLICATION = "microtasks.asgi.application"
-
-# CHANNEL_LAYERS = {
-#     "default": {
-#         "BACKEND": "channels_redis.core.RedisChannelLayer",
-#         "CONFIG": {
-#             "hosts": [os.environ.get("REDIS_URL")],
-#         },
-#     }
-# }
+ASGI_APPLICATION = "microtasks.asgi.application"
+
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "CONFIG": {
+            "hosts": [os.environ.get("REDIS_URL")],
+        },
+    }
+}
 